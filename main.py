@@ -1,15 +1,510 @@
+import asyncio
 import json
 import re
+import hashlib
+import heapq
 import os
 import random
-from typing import Dict, Any, List
+import shutil
+import string
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import ExitStack, contextmanager
+from functools import cached_property, lru_cache, wraps
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
+from itertools import islice
 
 from astrbot.api.event import filter, AstrMessageEvent
 from astrbot.api.star import Context, Star, register
 from astrbot.api.provider import LLMResponse, ProviderRequest
 from astrbot.api import logger, AstrBotConfig
 
+try:
+    import orjson  # 可选依赖，安装后JSON读写更快
+except ImportError:
+    orjson = None
+
+try:
+    import re2  # 可选依赖，线性时间匹配，用于扫描整段LLM响应
+except ImportError:
+    re2 = None
+
+
+if orjson is not None:
+    def _json_dumps(data: Any, indent: bool = False) -> bytes:
+        """序列化为UTF-8 JSON字节串（默认紧凑格式，用于JSONL的单行记录；indent=True 时缩进2格，用于JSON数据文件）"""
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_INDENT_2 if indent else orjson.OPT_NON_STR_KEYS
+        return orjson.dumps(data, option=option)
+
+    _json_loads = orjson.loads
+else:
+    def _json_dumps(data: Any, indent: bool = False) -> bytes:
+        """序列化为UTF-8 JSON字节串（默认紧凑格式，用于JSONL的单行记录；indent=True 时缩进2格，用于JSON数据文件）"""
+        if indent:
+            return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    _json_loads = json.loads
+
+
+def _load_json(path: str, default: Any = None) -> Any:
+    """读取JSON文件，文件不存在或内容损坏时返回 default（直接打开，不单独检查存在性）"""
+    try:
+        with open(path, "rb") as f:
+            return _json_loads(f.read())
+    except (ValueError, OSError):
+        return default
+
+
+def _ensure_dir(path: str):
+    """确保目录存在（不做进程内缓存，目录被删除或工作目录变化后也能重新创建）"""
+    os.makedirs(path, exist_ok=True)
+
+
+def _open_for_write(path: str, mode: str):
+    """打开文件用于写入；所在目录已被删除时重新创建后再打开"""
+    try:
+        return open(path, mode)
+    except FileNotFoundError:
+        _ensure_dir(os.path.dirname(path) or ".")
+        return open(path, mode)
+
+
+def _write_bytes(path: str, payload: bytes):
+    """一次写入临时文件后原子替换，中途崩溃不会留下半截文件"""
+    tmp_path = path + ".tmp"
+    with _open_for_write(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def _save_json(path: str, data: Any):
+    """写入JSON数据文件（缩进2格便于管理员手动查看和修改，先在内存中序列化再原子写入）"""
+    _write_bytes(path, _json_dumps(data, indent=True))
+
+
+def _load_jsonl(path: str, maxlen: Optional[int] = None) -> Optional[List[Any]]:
+    """
+    逐行读取JSONL文件（每行一个JSON），文件不存在时返回 None，跳过写入中断的残行
+    指定 maxlen 时只保留最后 maxlen 条（返回 deque），读取大文件时内存占用不随文件增长
+    """
+    if not os.path.exists(path):
+        return None
+    items = deque(maxlen=maxlen) if maxlen else []
+    try:
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    items.append(_json_loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return items
+
+
+def _read_jsonl_entries(path: str) -> List[tuple]:
+    """逐行读取JSONL文件，返回 [(以换行结尾的原始行, 解析结果), ...]，跳过空行和无法解析的残行"""
+    entries = []
+    try:
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    item = _json_loads(line)
+                except ValueError:
+                    continue
+                entries.append((line if line.endswith(b"\n") else line + b"\n", item))
+    except OSError:
+        pass
+    return entries
+
+
+def _append_jsonl(path: str, item: Any) -> int:
+    """向JSONL文件末尾追加一行，返回写入的字节数"""
+    line = _json_dumps(item) + b"\n"
+    with _open_for_write(path, "ab") as f:
+        f.write(line)
+    return len(line)
+
+
+def _save_jsonl(path: str, items: List[Any]) -> int:
+    """整体重写JSONL文件（原子替换），返回文件字节数"""
+    payload = b"".join(_json_dumps(item) + b"\n" for item in items)
+    _write_bytes(path, payload)
+    return len(payload)
+
+
+# 当前秒的 (秒数, 日期, 日期时间) 格式化缓存，同一秒内的多次调用复用结果
+_clock_cache = (0, "", "")
+
+
+def _clock_strings() -> tuple:
+    """返回当前秒对应的 (秒数, 日期字符串, 日期时间字符串)"""
+    global _clock_cache
+    second = int(time.time())
+    if second != _clock_cache[0]:
+        now = datetime.fromtimestamp(second)
+        _clock_cache = (second, now.date().isoformat(), now.isoformat(sep=" ", timespec="seconds"))
+    return _clock_cache
+
+
+def _today_str() -> str:
+    """当前日期 YYYY-MM-DD"""
+    return _clock_strings()[1]
+
+
+def _now_str() -> str:
+    """当前时间 YYYY-MM-DD HH:MM:SS"""
+    return _clock_strings()[2]
+
+
+# 单次扫描响应中的所有 [...] 标记块（安装了 re2 时使用 re2）
+_TAG_BLOCK_PATTERN = (re2 or re).compile(r"\[([^\]]*)\]")
+# 标记类型识别（按优先级排列，块内包含关键词即归为该类型）
+# 只在短小的标记块内匹配且含后顾断言，始终使用标准库 re；忽略大小写只作用于英文关键词（ASCII 折叠）
+_TAG_KIND_PATTERNS = (
+    ("spend", re.compile(r"(?i:Spend)|花费|支出", re.ASCII)),
+    ("store", re.compile(r"(?i:Store)|入库|收纳", re.ASCII)),
+    ("use_gift", re.compile(r"(?i:UseGift)|使用礼物|用礼物", re.ASCII)),
+    ("use", re.compile(r"(?i:(?<!e)Use(?!Gift))|使用(?!礼物)|用掉", re.ASCII)),
+    ("gift", re.compile(r"(?i:Gift)|礼物|收礼", re.ASCII)),
+    ("refund", re.compile(r"(?i:Refund)|退款|退钱", re.ASCII)),
+    ("note", re.compile(r"(?i:Note)|笔记|备忘|记录", re.ASCII)),
+    ("apply_withdraw", re.compile(r"(?i:ApplyWithdraw)|申请取款|取存折", re.ASCII)),
+)
+
+# 标记字段键名同义词 -> 统一字段名
+_TAG_FIELD_KEYS = {
+    "spend": "spend", "花费": "spend", "支出": "spend",
+    "reason": "reason", "原因": "reason", "用途": "reason", "理由": "reason",
+    "store": "store", "入库": "store", "收纳": "store",
+    "desc": "desc", "描述": "desc", "说明": "desc",
+    "use": "use", "使用": "use", "用掉": "use",
+    "usegift": "use_gift", "使用礼物": "use_gift", "用礼物": "use_gift",
+    "gift": "gift", "礼物": "gift", "收礼": "gift",
+    "from": "from", "来自": "from", "送礼人": "from",
+    "refund": "refund", "退款": "refund", "退钱": "refund",
+    "note": "note", "笔记": "note", "备忘": "note", "记录": "note",
+    "applywithdraw": "apply_withdraw", "申请取款": "apply_withdraw", "取存折": "apply_withdraw",
+}
+# 键名前混有其他文字时按结尾匹配同义词，长的优先（UseGift 先于 Gift）
+_TAG_FIELD_KEY_SUFFIXES = tuple(sorted(_TAG_FIELD_KEYS.items(), key=lambda kv: -len(kv[0])))
+# 值延伸到标记结尾的字段（内容允许包含逗号）
+_TAG_TAIL_FIELDS = frozenset({"desc", "use", "use_gift", "note"})
+# 全角标点归一为半角，仅用于定位分隔符（长度不变）
+_TAG_PUNCT_TABLE = str.maketrans("，：", ",:")
+# 金额只匹配半角数字（re.ASCII 下 \d 不查 Unicode 表）；全角数字仅在匹配失败时归一后重试
+_TAG_AMOUNT_PATTERN = re.compile(r"\d+(?:\.\d+)?", re.ASCII)
+_FULLWIDTH_DIGIT_TABLE = str.maketrans("０１２３４５６７８９．", "0123456789.")
+
+
+def _scan_tags(text: str) -> tuple:
+    """
+    单次扫描文本中的所有标记块
+    返回 (移除已识别标记及其两侧空白后的文本, {标记类型: [方括号内的内容, ...]})
+    未识别的方括号内容原样保留
+    """
+    kind_patterns = _TAG_KIND_PATTERNS
+    tags: Dict[str, List[str]] = {}
+    pieces = []
+    last = 0
+    for m in _TAG_BLOCK_PATTERN.finditer(text):
+        content = m.group(1)
+        kind = next((k for k, p in kind_patterns if p.search(content)), None)
+        if kind is None:
+            continue
+        tags.setdefault(kind, []).append(content)
+        start, end = m.start(), m.end()
+        while start > last and text[start - 1].isspace():
+            start -= 1
+        while end < len(text) and text[end].isspace():
+            end += 1
+        pieces.append(text[last:start])
+        last = end
+    if not tags:
+        return text, tags
+    pieces.append(text[last:])
+    return "".join(pieces).strip(), tags
+
+
+def _parse_tag_fields(content: str) -> Dict[str, str]:
+    """
+    拆分标记内容 "Key: value, Key: value" 为字段字典
+    - 键名按同义词归一（不区分大小写），中英文冒号、逗号均可
+    - 尾字段（描述、物品名、笔记）的值延伸到标记结尾
+    - 第一个字段之后的原文记为 "_rest"，仅在完全没写 Reason 时用作兜底原因（Reason 为空时不使用）
+    """
+    fields: Dict[str, str] = {}
+    norm = content.translate(_TAG_PUNCT_TABLE)
+    pos, end = 0, len(content)
+    while True:
+        comma = norm.find(",", pos)
+        seg_end = end if comma < 0 else comma
+        colon = norm.find(":", pos, seg_end)
+        if colon >= 0:
+            raw_key = content[pos:colon].strip().casefold()
+            key = _TAG_FIELD_KEYS.get(raw_key) or next(
+                (v for k, v in _TAG_FIELD_KEY_SUFFIXES if raw_key.endswith(k)), None
+            )
+            if key in _TAG_TAIL_FIELDS:
+                fields.setdefault(key, content[colon + 1:].strip())
+                break
+            if key:
+                fields.setdefault(key, content[colon + 1:seg_end].strip())
+                if pos == 0 and comma >= 0:
+                    fields["_rest"] = content[comma + 1:].strip()
+        if comma < 0:
+            break
+        pos = comma + 1
+    return fields
+
+
+def _parse_tag_amount(value: Optional[str]) -> Optional[float]:
+    """取字段值开头的数字作为金额（如 "4元" -> 4.0），无法解析时返回 None"""
+    value = value or ""
+    match = _TAG_AMOUNT_PATTERN.match(value) or _TAG_AMOUNT_PATTERN.match(value.translate(_FULLWIDTH_DIGIT_TABLE))
+    return float(match.group()) if match else None
+
+
+def _admin_required(func):
+    """管理员命令装饰器：非管理员直接回复拒绝消息，不进入命令处理"""
+    @wraps(func)
+    async def wrapper(self, event: AstrMessageEvent, *args, **kwargs):
+        if not self._is_admin(event):
+            yield event.plain_result(self.admin_denied_msg)
+            return
+        async for result in func(self, event, *args, **kwargs):
+            yield result
+    return wrapper
+
+
+# 命令参数中的金额：可带正负号的十进制数（不接受 inf、nan、科学计数法）
+_AMOUNT_ARG_PATTERN = re.compile(r"\s*([+-]?(?:\d+(?:\.\d*)?|\.\d+))\s*$", re.ASCII)
+
+# 非管理员执行管理命令时的默认回复（与 _conf_schema.json 中的默认值一致）
+_DEFAULT_DENIED_MSG = "只有奥卢斯大人能动我的钱包和查账"
+
+def _safe_int(text: str, default: Optional[int] = None) -> Optional[int]:
+    """解析命令中的整数参数（允许首尾空白和一个正负号），格式不对时返回默认值而不抛出异常"""
+    text = text.strip()
+    digits = text[1:] if text[:1] in ("+", "-") else text
+    if not digits.isdecimal():
+        return default
+    value = int(digits)
+    return -value if text[0] == "-" else value
+
+
+def _escape_braces(text: str) -> str:
+    """转义花括号，使文本在 str.format 中按原样输出"""
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+def _bake_template(template: str, static: Dict[str, Any]) -> str:
+    """
+    预先代入模板中的静态字段，返回仍可 str.format 的模板
+    带格式说明或转换符的字段保持原样，由调用方在 format 时照常提供
+    """
+    parts = []
+    for literal, field, spec, conversion in string.Formatter().parse(template):
+        parts.append(_escape_braces(literal))
+        if field is None:
+            continue
+        if field in static and not spec and not conversion:
+            parts.append(_escape_braces(str(static[field])))
+        else:
+            parts.append("{" + field + (f"!{conversion}" if conversion else "") + (f":{spec}" if spec else "") + "}")
+    return "".join(parts)
+
+
+# 排行榜前三名奖牌
+_MEDALS = ("🥇", "🥈", "🥉")
+
+# 星期名称（下标 0=周一）
+_WEEKDAY_NAMES = ("周一", "周二", "周三", "周四", "周五", "周六", "周日")
+
+# 记录类型 -> (金额符号, 展示标签)，未知类型按出账显示
+_RECORD_TYPE_DISPLAY = {"income": ("+", "📈 入账"), "expense": ("-", "📉 出账")}
+_RECORD_TYPE_DEFAULT = _RECORD_TYPE_DISPLAY["expense"]
+
+# 查流水每行格式：时间 | 符号金额元 | 原因[ | @操作人]
+_FLOW_ROW_FORMAT = "%s | %s%s元 | %s%s\n"
+
+
+# 延迟写入失败后重试的最长等待时间（秒）
+_SAVE_RETRY_MAX_DELAY = 300.0
+
+# 交易记录文件超过此大小时，旧记录移入归档文件，只保留内存中的最近记录
+# 实际阈值取此值与上次压缩后文件大小两倍中的较大者，保留的记录本身较大时也不会每次追加都压缩
+_RECORDS_LOG_COMPACT_BYTES = 256 * 1024
+
+# 管理器文件写入锁（每个文件一把）：同一文件的延迟写入与同步保存互斥，不同文件可并行写入
+_save_locks: Dict[str, threading.Lock] = {}
+
+def _get_save_lock(path: str) -> threading.Lock:
+    """获取文件对应的写入锁（setdefault 为原子操作，多线程下也只会创建一把）"""
+    lock = _save_locks.get(path)
+    if lock is None:
+        lock = _save_locks.setdefault(path, threading.Lock())
+    return lock
+
+
+class BatchSaveMixin:
+    """
+    批量保存支持
+    - data 在首次访问时才调用 _load_data() 从文件加载
+    - 变更方法只调用 _mark_dirty() 标记数据已修改
+    - 事件循环运行中时延迟 _save_delay 秒合并写入，期间的多次修改只落盘一次；
+      序列化在事件循环中完成（保证快照一致），文件写入交给线程池，不阻塞其他消息
+    - 没有运行中的事件循环时（如初始化阶段）立即落盘
+    - 在 with manager.batch(): 中的多次修改只在退出时合并写入一次
+    - flush() 取消延迟并立即写入，插件终止时调用
+    - 每次修改递增 _version，_cached() 据此缓存提示词等派生结果
+    """
+
+    _data = None
+    _dirty = False
+    _batch_depth = 0
+    _version = 0
+    _derived_version = -1
+    _derived_cache = None
+    _save_delay = 2.0
+    _save_handle = None
+    _saved_version = -1
+    _saved_digest = None
+    _save_failures = 0  # 连续写入失败次数，用于计算重试退避时间
+
+    def _load_data(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def _dump_data(self) -> tuple:
+        """序列化当前数据，返回 (文件路径, JSON字节串)"""
+        raise NotImplementedError
+
+    def _save_data(self):
+        """同步序列化并写入文件"""
+        path, payload = self._dump_data()
+        self._write_dump(self._version, path, payload)
+
+    def _write_dump(self, version: int, path: str, payload: bytes):
+        """写入序列化结果（可在线程池中执行），较旧的快照不会覆盖已写入的较新快照，内容未变时跳过写入"""
+        digest = hashlib.blake2b(payload, digest_size=16).digest()
+        with _get_save_lock(path):
+            if version < self._saved_version:
+                return
+            if digest != self._saved_digest:
+                _write_bytes(path, payload)
+                self._saved_digest = digest
+            self._saved_version = version
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        """管理器数据（懒加载）"""
+        if self._data is None:
+            self._data = self._load_data()
+        return self._data
+
+    @data.setter
+    def data(self, value: Dict[str, Any]):
+        self._data = value
+        self._version += 1
+
+    def _mark_dirty(self):
+        """标记数据已修改（批量上下文外安排保存）"""
+        self._dirty = True
+        self._version += 1
+        if not self._batch_depth:
+            self._schedule_save()
+
+    def _schedule_save(self, delay: Optional[float] = None):
+        """安排延迟保存（默认延迟 _save_delay 秒）；没有运行中的事件循环时立即保存"""
+        if self._save_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._save_if_dirty()
+            return
+        self._save_handle = loop.call_later(self._save_delay if delay is None else delay, self._deferred_save)
+
+    def _deferred_save(self):
+        """延迟保存回调：在事件循环中序列化，在线程池中写入（仍在批量上下文中时交由退出时处理）"""
+        self._save_handle = None
+        if self._batch_depth or not self._dirty:
+            return
+        try:
+            path, payload = self._dump_data()
+        except Exception as e:
+            logger.error(f"[PocketMoney] 延迟保存数据失败: {e}")
+            return
+        self._dirty = False
+        future = asyncio.get_running_loop().run_in_executor(
+            None, self._write_dump, self._version, path, payload
+        )
+        future.add_done_callback(self._on_write_done)
+
+    def _on_write_done(self, future):
+        """线程池写入完成回调：失败时记录日志，标记为待保存并按指数退避重新安排保存"""
+        if future.cancelled():
+            return
+        e = future.exception()
+        if e is None:
+            self._save_failures = 0
+            return
+        self._save_failures += 1
+        delay = min(self._save_delay * 2 ** self._save_failures, _SAVE_RETRY_MAX_DELAY)
+        logger.error(f"[PocketMoney] 延迟保存数据失败（第{self._save_failures}次），{delay:g}秒后重试: {e!r}")
+        self._dirty = True
+        self._schedule_save(delay)
+
+    def _save_if_dirty(self):
+        """有未保存的修改时写入文件"""
+        if self._dirty:
+            self._save_data()
+            self._dirty = False
+
+    def flush(self):
+        """取消延迟保存并立即写入文件"""
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        self._save_data()
+        self._dirty = False
+
+    async def flush_async(self):
+        """取消延迟保存，在事件循环中序列化后交给线程池写入，可与其他管理器的写入并行"""
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        path, payload = self._dump_data()
+        self._dirty = False
+        await asyncio.get_running_loop().run_in_executor(None, self._write_dump, self._version, path, payload)
+
+    def _cached(self, key: Any, build):
+        """返回按数据版本缓存的派生结果，数据修改后自动重新计算"""
+        if self._derived_version != self._version:
+            self._derived_cache = {}
+            self._derived_version = self._version
+        if key not in self._derived_cache:
+            self._derived_cache[key] = build()
+        return self._derived_cache[key]
+
+    @contextmanager
+    def batch(self):
+        """批量修改上下文，退出时合并保存（支持嵌套）"""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth and self._dirty:
+                self._schedule_save()
+
 
 class UserIsolationManager:
     """
@@ -24,7 +519,7 @@ class UserIsolationManager:
         self.data_dir = data_dir
         self.isolation_dir = os.path.join(data_dir, "isolation")
         self.shared_isolation_dir = os.path.join(self.isolation_dir, "shared")
-        os.makedirs(self.shared_isolation_dir, exist_ok=True)
+        _ensure_dir(self.shared_isolation_dir)
         self.blacklist = self._load_blacklist()
         self.pending_refunds = self._load_pending_refunds()
         # 共享隔离池管理器（单例）
@@ -34,20 +529,11 @@ class UserIsolationManager:
 
     def _load_blacklist(self) -> List[str]:
         """加载黑名单"""
-        path = os.path.join(self.data_dir, "blacklist.json")
-        if os.path.exists(path):
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError):
-                pass
-        return []
+        return _load_json(os.path.join(self.data_dir, "blacklist.json"), [])
 
     def _save_blacklist(self):
         """保存黑名单"""
-        path = os.path.join(self.data_dir, "blacklist.json")
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(self.blacklist, f, ensure_ascii=False, indent=2)
+        _save_json(os.path.join(self.data_dir, "blacklist.json"), self.blacklist)
 
     def _migrate_old_isolation_data(self):
         """
@@ -80,68 +566,56 @@ class UserIsolationManager:
             user_id = item
             
             # 读取用户的隔离池余额和记录
-            old_money_file = os.path.join(user_dir, "pocket_money.json")
-            if os.path.exists(old_money_file):
-                try:
-                    with open(old_money_file, "r", encoding="utf-8") as f:
-                        old_data = json.load(f)
-                        # 合并余额（取最高值，因为所有用户应该看到相同的初始余额）
-                        user_balance = old_data.get("balance", 0)
-                        if user_balance > total_balance:
-                            total_balance = user_balance
-                        # 合并记录
-                        for record in old_data.get("records", []):
-                            record["migrated_from"] = user_id
-                            all_records.append(record)
-                except (json.JSONDecodeError, IOError):
-                    pass
+            old_data = _load_json(os.path.join(user_dir, "pocket_money.json"))
+            if isinstance(old_data, dict):
+                # 合并余额（取最高值，因为所有用户应该看到相同的初始余额）
+                user_balance = old_data.get("balance", 0)
+                if user_balance > total_balance:
+                    total_balance = user_balance
+                # 合并记录
+                for record in old_data.get("records", []):
+                    record["migrated_from"] = user_id
+                    all_records.append(record)
             
             # 读取用户的隔离池背包
-            old_backpack_file = os.path.join(user_dir, "backpack.json")
-            if os.path.exists(old_backpack_file):
-                try:
-                    with open(old_backpack_file, "r", encoding="utf-8") as f:
-                        old_bp = json.load(f)
-                        # 合并共享物品（去重）
-                        for item_data in old_bp.get("shared_items", []):
-                            if item_data not in all_shared_items:
-                                all_shared_items.append(item_data)
-                        # 合并用户专属格子
-                        for uid, items in old_bp.get("user_slots", {}).items():
-                            if uid not in all_user_slots:
-                                all_user_slots[uid] = []
-                            for item_data in items:
-                                if item_data not in all_user_slots[uid]:
-                                    all_user_slots[uid].append(item_data)
-                except (json.JSONDecodeError, IOError):
-                    pass
+            old_bp = _load_json(os.path.join(user_dir, "backpack.json"))
+            if isinstance(old_bp, dict):
+                # 合并共享物品（去重）
+                for item_data in old_bp.get("shared_items", []):
+                    if item_data not in all_shared_items:
+                        all_shared_items.append(item_data)
+                # 合并用户专属格子
+                for uid, items in old_bp.get("user_slots", {}).items():
+                    if uid not in all_user_slots:
+                        all_user_slots[uid] = []
+                    for item_data in items:
+                        if item_data not in all_user_slots[uid]:
+                            all_user_slots[uid].append(item_data)
             
             migrated_users.append(user_id)
         
         if not migrated_users:
             return
         
-        # 按时间排序记录
-        all_records.sort(key=lambda x: x.get("time", ""))
+        # 只取时间最近的50条（同一时间按读取顺序），再按时间升序排列
+        latest = heapq.nlargest(50, enumerate(all_records), key=lambda p: (p[1].get("time", ""), p[0]))
         
         # 写入共享隔离池数据
         shared_money_data = {
             "balance": total_balance,
-            "records": all_records[-50:],  # 保留最近50条
+            "records": [r for _, r in reversed(latest)],  # 保留最近50条
             "notes": [],
             "savings_balance": 0,
             "pending_withdrawals": []
         }
-        with open(shared_money_file, "w", encoding="utf-8") as f:
-            json.dump(shared_money_data, f, ensure_ascii=False, indent=2)
+        _save_json(shared_money_file, shared_money_data)
         
         shared_backpack_file = os.path.join(self.shared_isolation_dir, "backpack.json")
         shared_backpack_data = {
             "shared_items": all_shared_items,
             "user_slots": all_user_slots
         }
-        with open(shared_backpack_file, "w", encoding="utf-8") as f:
-            json.dump(shared_backpack_data, f, ensure_ascii=False, indent=2)
+        _save_json(shared_backpack_file, shared_backpack_data)
         
         logger.info(f"[PocketMoney] 已迁移 {len(migrated_users)} 个用户的隔离池数据到共享池: {migrated_users}")
         logger.info(f"[PocketMoney] 共享隔离池余额: {total_balance}元, 记录: {len(all_records)}条, 共享物品: {len(all_shared_items)}件")
@@ -251,8 +725,7 @@ class UserIsolationManager:
                 "records": [],
                 "notes": []
             }
-            with open(money_file, "w", encoding="utf-8") as f:
-                json.dump(init_data, f, ensure_ascii=False, indent=2)
+            _save_json(money_file, init_data)
         
         # 创建共享隔离管理器实例
         isolated_money = PocketMoneyManager(self.shared_isolation_dir, 0, 50)
@@ -272,11 +745,27 @@ class UserIsolationManager:
         """
         return self._get_or_create_shared_managers(real_money_mgr, real_backpack_mgr)
 
+    @contextmanager
+    def batch(self):
+        """共享隔离池管理器的批量修改上下文（共享池尚未创建时不做处理）"""
+        with ExitStack() as stack:
+            if self.blacklist and self._shared_managers:
+                for mgr in self._shared_managers.values():
+                    stack.enter_context(mgr.batch())
+            yield self
+
+    async def flush_async(self):
+        """插件终止时保存共享隔离池数据（共享池管理器并行写入）"""
+        if self._shared_managers:
+            await asyncio.gather(*(mgr.flush_async() for mgr in self._shared_managers.values()))
+        self._save_blacklist()
+        self._save_pending_refunds()
+
     def _save_data(self):
         """保存共享隔离池数据"""
         if self._shared_managers:
-            self._shared_managers["money"]._save_data()
-            self._shared_managers["backpack"]._save_data()
+            self._shared_managers["money"].flush()
+            self._shared_managers["backpack"].flush()
         self._save_blacklist()
         self._save_pending_refunds()
 
@@ -319,29 +808,23 @@ class UserIsolationManager:
 
     def _load_pending_refunds(self) -> List[Dict]:
         """加载隔离池待退款列表"""
-        path = os.path.join(self.shared_isolation_dir, "pending_refunds.json")
-        if os.path.exists(path):
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError):
-                pass
-        return []
+        return _load_json(os.path.join(self.shared_isolation_dir, "pending_refunds.json"), [])
 
     def _save_pending_refunds(self):
         """保存隔离池待退款列表"""
-        path = os.path.join(self.shared_isolation_dir, "pending_refunds.json")
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(self.pending_refunds, f, ensure_ascii=False, indent=2)
+        _save_json(os.path.join(self.shared_isolation_dir, "pending_refunds.json"), self.pending_refunds)
 
     def add_pending_refund(self, amount: float, reason: str, operator_id: str):
         """添加待退款（隔离池出账时调用，2小时后自动静默退款）"""
+        # 出账时间与退款时间取自同一时刻；time 需与出账记录的时间一致，用于退款后清除记录
+        now_str = _now_str()
+        refund_at = datetime.fromisoformat(now_str) + timedelta(hours=2)
         self.pending_refunds.append({
             "amount": amount,
             "reason": reason,
             "operator_id": operator_id,
-            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "refund_at": (datetime.now() + timedelta(hours=2)).strftime("%Y-%m-%d %H:%M:%S")
+            "time": now_str,
+            "refund_at": refund_at.isoformat(sep=" ", timespec="seconds")
         })
         self._save_pending_refunds()
 
@@ -353,9 +836,9 @@ class UserIsolationManager:
         refunded_times = []  # 记录已退款的原始出账时间，用于清除记录
         for refund in self.pending_refunds:
             try:
-                refund_at = datetime.strptime(refund["refund_at"], "%Y-%m-%d %H:%M:%S")
+                refund_at = datetime.fromisoformat(refund["refund_at"])
                 if now >= refund_at:
-                    money_mgr.data["balance"] = round(money_mgr.get_balance() + refund["amount"], 2)
+                    money_mgr.credit(refund["amount"])
                     refunded_total += refund["amount"]
                     refunded_times.append(refund.get("time"))
                     logger.debug(f"[PocketMoney] 隔离池静默退款: +{refund['amount']}元 (原因: {refund['reason']})")
@@ -367,11 +850,10 @@ class UserIsolationManager:
         if refunded_total > 0:
             # 清除已退款的 isolation 出账记录（静默，不留痕迹）
             if refunded_times:
-                money_mgr.data["records"] = [
-                    r for r in money_mgr.data.get("records", [])
-                    if not (r.get("isolation") and r.get("time") in refunded_times)
-                ]
-            money_mgr._save_data()
+                money_mgr.remove_records(
+                    lambda r: r.get("isolation") and r.get("time") in refunded_times
+                )
+            money_mgr._mark_dirty()
             self.pending_refunds = remaining
             self._save_pending_refunds()
             logger.info(f"[PocketMoney] 隔离池静默退款合计: +{refunded_total}元，剩余待退款: {len(remaining)}条")
@@ -380,7 +862,7 @@ class UserIsolationManager:
             self._save_pending_refunds()
 
 
-class ThankLetterManager:
+class ThankLetterManager(BatchSaveMixin):
     """
     表扬信管理系统
     - 记录每日发送限制（每账号每天一封）
@@ -391,129 +873,142 @@ class ThankLetterManager:
     def __init__(self, data_dir: str):
         self.data_dir = data_dir
         self._init_path()
-        self.data = self._load_data()
 
     def _init_path(self):
         """初始化数据目录"""
-        os.makedirs(self.data_dir, exist_ok=True)
+        _ensure_dir(self.data_dir)
+
+    @staticmethod
+    def _default_data() -> Dict[str, Any]:
+        """表扬信数据的默认字段（每次返回新的字典）"""
+        return {
+            "daily_senders": {},  # {"2024-01-01": {"sender_id1", "sender_id2"}}，文件中存为列表
+            "ranking": {},  # {"sender_id": {"name": str, "count": int}}
+            "today_bonus": 0,  # 今日表扬奖金
+            "today_date": "",  # 今日日期
+            "total_bonus": 0  # 累计表扬奖金
+        }
 
     def _load_data(self) -> Dict[str, Any]:
         """加载表扬信数据"""
-        path = os.path.join(self.data_dir, "thank_letters.json")
-        if not os.path.exists(path):
-            return {
-                "daily_senders": {},  # {"2024-01-01": ["sender_id1", "sender_id2"]}
-                "ranking": {},  # {"sender_id": count}
-                "today_bonus": 0,  # 今日表扬奖金
-                "today_date": "",  # 今日日期
-                "total_bonus": 0  # 累计表扬奖金
-            }
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                # 确保所有字段存在
-                if "daily_senders" not in data:
-                    data["daily_senders"] = {}
-                if "ranking" not in data:
-                    data["ranking"] = {}
-                if "today_bonus" not in data:
-                    data["today_bonus"] = 0
-                if "today_date" not in data:
-                    data["today_date"] = ""
-                if "total_bonus" not in data:
-                    data["total_bonus"] = 0
-                return data
-        except (json.JSONDecodeError, TypeError):
-            return {
-                "daily_senders": {},
-                "ranking": {},
-                "today_bonus": 0,
-                "today_date": "",
-                "total_bonus": 0
-            }
-
-    def _save_data(self):
-        """保存表扬信数据"""
-        path = os.path.join(self.data_dir, "thank_letters.json")
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
-
-    def _check_and_reset_daily(self):
-        """检查并重置每日数据（24点重置）"""
-        today = datetime.now().strftime("%Y-%m-%d")
+        data = _load_json(os.path.join(self.data_dir, "thank_letters.json"))
+        if not isinstance(data, dict):
+            return self._default_data()
+        # 一次合并补齐缺失字段，文件中已有的值优先
+        data = {**self._default_data(), **data}
+        data["ranking"] = self._migrate_ranking(data["ranking"])
+        # 每日发送者在内存中使用集合，O(1) 判断是否已发送
+        data["daily_senders"] = {k: set(v) for k, v in data["daily_senders"].items()}
+        return data
+
+    @staticmethod
+    def _migrate_ranking(ranking: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """
+        迁移旧版排行榜结构
+        旧结构: {"sender_id|sender_name": count}
+        新结构: {"sender_id": {"name": sender_name, "count": count}}
+        """
+        migrated = {}
+        for key, value in ranking.items():
+            if isinstance(value, dict):
+                entry = migrated.setdefault(key, {"name": value.get("name") or key, "count": 0})
+                entry["count"] += value.get("count", 0)
+                continue
+            sender_id, _, sender_name = key.partition("|")
+            entry = migrated.setdefault(sender_id, {"name": sender_name or sender_id, "count": 0})
+            entry["count"] += value
+        return migrated
+
+    def _dump_data(self) -> tuple:
+        """序列化表扬信数据（每日发送者集合转为排序后的列表，相同数据输出稳定）"""
+        data = dict(self.data)
+        data["daily_senders"] = {k: sorted(v) for k, v in self.data["daily_senders"].items()}
+        return os.path.join(self.data_dir, "thank_letters.json"), _json_dumps(data, indent=True)
+
+    def _check_and_reset_daily(self) -> str:
+        """检查并重置每日数据（24点重置），返回今天的日期字符串"""
+        today = _today_str()
         if self.data["today_date"] != today:
             self.data["today_date"] = today
             self.data["today_bonus"] = 0
             # 清理过期的每日记录（保留最近7天）
-            cutoff = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
+            cutoff = (datetime.fromisoformat(today) - timedelta(days=7)).date().isoformat()
             self.data["daily_senders"] = {
                 k: v for k, v in self.data["daily_senders"].items() if k >= cutoff
             }
-            self._save_data()
+            self._mark_dirty()
+        return today
 
     def can_send_today(self, sender_id: str) -> bool:
         """检查该用户今天是否还能发送表扬信"""
-        self._check_and_reset_daily()
-        today = datetime.now().strftime("%Y-%m-%d")
-        today_senders = self.data["daily_senders"].get(today, [])
-        return sender_id not in today_senders
+        today = self._check_and_reset_daily()
+        return sender_id not in self.data["daily_senders"].get(today, ())
 
     def record_thank_letter(self, sender_id: str, sender_name: str, amount: int) -> bool:
         """
         记录一封表扬信
         :return: 是否成功
         """
-        self._check_and_reset_daily()
-        today = datetime.now().strftime("%Y-%m-%d")
+        today = self._check_and_reset_daily()
         
         # 检查今日是否已发送
-        if not self.can_send_today(sender_id):
+        today_senders = self.data["daily_senders"].setdefault(today, set())
+        if sender_id in today_senders:
             return False
         
         # 记录今日发送者
-        if today not in self.data["daily_senders"]:
-            self.data["daily_senders"][today] = []
-        self.data["daily_senders"][today].append(sender_id)
-        
-        # 更新排行榜（使用sender_id作为key，同时存储sender_name）
-        ranking_key = f"{sender_id}|{sender_name}"
-        # 先查找是否有旧的记录（可能名字变了）
-        old_key = None
-        for key in self.data["ranking"]:
-            if key.startswith(f"{sender_id}|"):
-                old_key = key
-                break
-        if old_key and old_key != ranking_key:
-            # 名字变了，迁移数据
-            self.data["ranking"][ranking_key] = self.data["ranking"].pop(old_key) + 1
-        else:
-            self.data["ranking"][ranking_key] = self.data["ranking"].get(ranking_key, 0) + 1
+        today_senders.add(sender_id)
+        
+        # 更新排行榜（使用sender_id作为key，名字变了直接覆盖）
+        entry = self.data["ranking"].setdefault(sender_id, {"name": sender_name, "count": 0})
+        entry["name"] = sender_name
+        entry["count"] += 1
         
         # 更新今日奖金
         self.data["today_bonus"] += amount
         self.data["total_bonus"] += amount
         
-        self._save_data()
+        self._mark_dirty()
         return True
 
     def get_today_bonus(self) -> int:
         """获取今日表扬奖金"""
         self._check_and_reset_daily()
-        return self.data.get("today_bonus", 0)
+        return self.data["today_bonus"]
 
     def get_total_bonus(self) -> int:
         """获取累计表扬奖金"""
-        return self.data.get("total_bonus", 0)
+        return self.data["total_bonus"]
 
     def get_ranking(self, top_n: int = 10) -> List[tuple]:
-        """获取表扬信排行榜"""
-        ranking = self.data.get("ranking", {})
-        # 排序并返回前N名
-        sorted_ranking = sorted(ranking.items(), key=lambda x: x[1], reverse=True)
-        return sorted_ranking[:top_n]
+        """获取表扬信排行榜，返回 [(sender_id, sender_name, count), ...]"""
+        ranking = self.data["ranking"]
+        # 只取前N名，无需对全部条目排序
+        top = heapq.nlargest(top_n, ranking.items(), key=lambda x: x[1]["count"])
+        return [(sid, entry["name"], entry["count"]) for sid, entry in top]
+
+
+# 物品名匹配时忽略的空白字符（半角/全角空格、制表符、换行）
+_ITEM_NAME_STRIP_TABLE = str.maketrans("", "", " \u3000\t\n")
+
+
+@lru_cache(maxsize=1024)
+def _normalize_item_name(name: str) -> str:
+    """标准化物品名用于模糊匹配：忽略空白和大小写（物品名有限，结果缓存复用）"""
+    return name.strip().casefold().translate(_ITEM_NAME_STRIP_TABLE)
 
 
-class BackpackManager:
+def _remove_item_by_name(items: List[Dict[str, Any]], name: str) -> bool:
+    """从物品列表中原地删除第一个名称匹配的物品，返回是否删除"""
+    normalized_name = _normalize_item_name(name)
+    for i, item in enumerate(items):
+        if item["name"] == name or _normalize_item_name(item["name"]) == normalized_name:
+            del items[i]
+            return True
+    return False
+
+
+class BackpackManager(BatchSaveMixin):
     """
     小背包管理系统
     - 共享背包：贝塔自己的物品存储（10个格子，只能放自己的东西）
@@ -528,51 +1023,40 @@ class BackpackManager:
         self.max_shared_slots = max_shared_slots
         self.max_user_slots = max_user_slots
         self._init_path()
-        self.data = self._load_data()
 
     def _init_path(self):
         """初始化数据目录"""
-        os.makedirs(self.data_dir, exist_ok=True)
+        _ensure_dir(self.data_dir)
 
     def _load_data(self) -> Dict[str, Any]:
         """加载背包数据"""
-        path = os.path.join(self.data_dir, "backpack.json")
-        if not os.path.exists(path):
-            return {"shared_items": [], "user_slots": {}}
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                # 兼容旧版本数据结构
-                if "items" in data and "shared_items" not in data:
-                    # 迁移旧数据
-                    data["shared_items"] = data.pop("items")
-                if "shared_items" not in data:
-                    data["shared_items"] = []
-                if "user_slots" not in data:
-                    data["user_slots"] = {}
-                return data
-        except (json.JSONDecodeError, TypeError):
+        data = _load_json(os.path.join(self.data_dir, "backpack.json"))
+        if not isinstance(data, dict):
             return {"shared_items": [], "user_slots": {}}
+        # 兼容旧版本数据结构
+        if "items" in data and "shared_items" not in data:
+            # 迁移旧数据
+            data["shared_items"] = data.pop("items")
+        # 一次合并补齐缺失字段，文件中已有的值优先
+        return {"shared_items": [], "user_slots": {}, **data}
 
-    def _save_data(self):
-        """保存背包数据"""
-        path = os.path.join(self.data_dir, "backpack.json")
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
+    def _dump_data(self) -> tuple:
+        """序列化背包数据"""
+        return os.path.join(self.data_dir, "backpack.json"), _json_dumps(self.data, indent=True)
 
     # ========== 共享背包操作 ==========
     
     def get_shared_items(self) -> List[Dict[str, Any]]:
         """获取共享背包所有物品"""
-        return self.data.get("shared_items", [])
+        return self.data["shared_items"]
 
     def get_shared_item_count(self) -> int:
         """获取共享背包物品数量"""
-        return len(self.data.get("shared_items", []))
+        return len(self.data["shared_items"])
 
     def is_shared_full(self) -> bool:
         """检查共享背包是否已满"""
-        return self.get_shared_item_count() >= self.max_shared_slots
+        return len(self.data["shared_items"]) >= self.max_shared_slots
 
     def add_shared_item(self, name: str, description: str) -> bool:
         """
@@ -585,10 +1069,10 @@ class BackpackManager:
         item = {
             "name": name,
             "description": description,
-            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "time": _now_str()
         }
         self.data["shared_items"].append(item)
-        self._save_data()
+        self._mark_dirty()
         return True
 
     def use_shared_item(self, name: str) -> bool:
@@ -596,28 +1080,21 @@ class BackpackManager:
         使用（移除）共享背包物品
         :return: 是否成功
         """
-        items = self.data.get("shared_items", [])
-        # 标准化输入名称用于模糊匹配
-        normalized_name = name.strip().lower().replace(" ", "").replace("\u3000", "")
-        for i, item in enumerate(items):
-            # 模糊匹配：忽略空格和大小写
-            item_normalized = item["name"].strip().lower().replace(" ", "").replace("\u3000", "")
-            if item_normalized == normalized_name or item["name"] == name:
-                items.pop(i)
-                self._save_data()
-                return True
+        if _remove_item_by_name(self.data["shared_items"], name):
+            self._mark_dirty()
+            return True
         return False
 
     def clear_shared_items(self):
         """清空共享背包"""
         self.data["shared_items"] = []
-        self._save_data()
+        self._mark_dirty()
 
     # ========== 用户专属格子操作 ==========
     
     def get_user_items(self, user_id: str) -> List[Dict[str, Any]]:
         """获取指定用户的专属格子物品"""
-        return self.data.get("user_slots", {}).get(user_id, [])
+        return self.data["user_slots"].get(user_id, [])
 
     def get_user_item_count(self, user_id: str) -> int:
         """获取指定用户的专属格子物品数量"""
@@ -639,19 +1116,15 @@ class BackpackManager:
         if self.is_user_slots_full(user_id):
             return False
         
-        if "user_slots" not in self.data:
-            self.data["user_slots"] = {}
-        if user_id not in self.data["user_slots"]:
-            self.data["user_slots"][user_id] = []
-        
+        slots = self.data["user_slots"].setdefault(user_id, [])
         item = {
             "name": name,
             "description": description,
             "from": from_who,
-            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "time": _now_str()
         }
-        self.data["user_slots"][user_id].append(item)
-        self._save_data()
+        slots.append(item)
+        self._mark_dirty()
         return True
 
     def use_user_item(self, user_id: str, name: str) -> bool:
@@ -659,216 +1132,304 @@ class BackpackManager:
         使用（移除）用户专属格子物品
         :return: 是否成功
         """
-        items = self.data.get("user_slots", {}).get(user_id, [])
-        # 标准化输入名称用于模糊匹配
-        normalized_name = name.strip().lower().replace(" ", "").replace("\u3000", "")
-        for i, item in enumerate(items):
-            # 模糊匹配：忽略空格和大小写
-            item_normalized = item["name"].strip().lower().replace(" ", "").replace("\u3000", "")
-            if item_normalized == normalized_name or item["name"] == name:
-                items.pop(i)
-                self._save_data()
-                return True
+        if _remove_item_by_name(self.data["user_slots"].get(user_id, []), name):
+            self._mark_dirty()
+            return True
         return False
 
     def clear_user_items(self, user_id: str):
         """清空指定用户的专属格子"""
-        if user_id in self.data.get("user_slots", {}):
+        if user_id in self.data["user_slots"]:
             self.data["user_slots"][user_id] = []
-            self._save_data()
+            self._mark_dirty()
 
     def get_all_user_slots(self) -> Dict[str, List[Dict[str, Any]]]:
         """获取所有用户的专属格子数据"""
-        return self.data.get("user_slots", {})
+        return self.data["user_slots"]
+
+    def iter_nonempty_user_slots(self):
+        """逐个返回有物品的用户 (user_id, 物品列表)，跳过已清空的格子"""
+        return ((uid, items) for uid, items in self.data["user_slots"].items() if items)
 
     # ========== 格式化方法 ==========
     
     def format_shared_items_for_prompt(self) -> str:
-        """格式化共享背包物品列表用于提示词"""
+        """格式化共享背包物品列表用于提示词（背包未变化时复用上次结果）"""
+        return self._cached("shared", self._format_shared_items)
+
+    def format_user_items_for_prompt(self, user_id: str) -> str:
+        """格式化用户专属格子物品列表用于提示词（背包未变化时复用上次结果）"""
+        return self._cached(("user", user_id), lambda: self._format_user_items(user_id))
+
+    def _format_shared_items(self) -> str:
         items = self.get_shared_items()
         if not items:
             return "空空如也"
         return "、".join([f"{item['name']}({item['description']})" for item in items])
 
-    def format_user_items_for_prompt(self, user_id: str) -> str:
-        """格式化用户专属格子物品列表用于提示词"""
+    def _format_user_items(self, user_id: str) -> str:
         items = self.get_user_items(user_id)
         if not items:
             return "空空如也"
         return "、".join([f"{item['name']}(来自{item['from']}: {item['description']})" for item in items])
 
 
-
-class PocketMoneyManager:
+class PocketMoneyManager(BatchSaveMixin):
     """
     小金库管理系统（含存折功能）
     - 全局余额管理（不区分会话）
-    - 入账/出账记录
+    - 入账/出账记录（追加写入 records.jsonl，余额等其余数据保存在 pocket_money.json，产生记录时两者同时落盘）
     - 存折：需要审批才能取款的安全余额
     - 笔记功能：贝塔可以自己编辑的备忘录
     """
 
+    # 余额数据更关键，缩短合并写入窗口（连续出账仍只写一次）
+    _save_delay = 0.25
+
     def __init__(self, data_dir: str, initial_balance: float = 0, max_records: int = 100):
         self.data_dir = data_dir
         self.initial_balance = initial_balance
         self.max_records = max_records
+        self.records_path = os.path.join(data_dir, "records.jsonl")
+        self.records_archive_path = os.path.join(data_dir, "records_archive.jsonl")
+        self._records_log_size = 0  # 记录文件当前字节数，超过 _records_log_limit 时压缩
+        self._records_log_limit = _RECORDS_LOG_COMPACT_BYTES
         self._init_path()
-        self.data = self._load_data()
         self._migrate_savings_data()  # 迁移旧的存折数据
 
     def _init_path(self):
         """初始化数据目录"""
-        os.makedirs(self.data_dir, exist_ok=True)
+        _ensure_dir(self.data_dir)
 
     def _load_data(self) -> Dict[str, Any]:
         """加载金库数据"""
-        path = os.path.join(self.data_dir, "pocket_money.json")
-        if not os.path.exists(path):
-            return {"balance": self.initial_balance, "records": [], "savings_balance": 0, "pending_withdrawals": []}
+        data = _load_json(os.path.join(self.data_dir, "pocket_money.json"))
+        if not isinstance(data, dict):
+            data = {}
+        # 一次合并补齐缺失字段，文件中已有的值优先
+        data = {
+            "balance": self.initial_balance,
+            "savings_balance": 0,
+            "pending_withdrawals": [],
+            **data
+        }
+        records = _load_jsonl(self.records_path, self.max_records if self.max_records > 0 else None)
+        if records is None:
+            # 旧版本记录内联在 pocket_money.json 中，迁移到独立的记录文件
+            records = data.get("records") or []
+            _save_jsonl(self.records_path, records)
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                if "balance" not in data:
-                    data["balance"] = self.initial_balance
-                if "records" not in data:
-                    data["records"] = []
-                if "savings_balance" not in data:
-                    data["savings_balance"] = 0
-                if "pending_withdrawals" not in data:
-                    data["pending_withdrawals"] = []
-                return data
-        except (json.JSONDecodeError, TypeError):
-            return {"balance": self.initial_balance, "records": [], "savings_balance": 0, "pending_withdrawals": []}
+            self._records_log_size = os.path.getsize(self.records_path)
+        except OSError:
+            self._records_log_size = 0
+        data["records"] = self._records_window(records)
+        return data
+
+    def _records_window(self, records) -> deque:
+        """内存中的记录窗口：最多保留最近 max_records 条，追加时自动淘汰最早的记录"""
+        return deque(records, maxlen=self.max_records if self.max_records > 0 else None)
 
     def _migrate_savings_data(self):
         """迁移旧的存折数据到小金库（仅执行一次）"""
         old_path = os.path.join(self.data_dir, "savings_book.json")
-        if os.path.exists(old_path):
-            try:
-                with open(old_path, "r", encoding="utf-8") as f:
-                    old_data = json.load(f)
-                    if old_data.get("balance", 0) > 0:
-                        self.data["savings_balance"] = old_data.get("balance", 0)
-                    if old_data.get("pending_withdrawals"):
-                        self.data["pending_withdrawals"] = old_data.get("pending_withdrawals", [])
-                    self._save_data()
-                    logger.info(f"[PocketMoney] 已迁移旧存折数据: 余额{old_data.get('balance', 0)}元")
-                # 迁移完成后重命名旧文件，防止重复迁移覆盖数据
-                migrated_path = old_path + ".migrated"
-                os.rename(old_path, migrated_path)
-                logger.info(f"[PocketMoney] 旧存折文件已重命名为 {migrated_path}")
-            except (json.JSONDecodeError, IOError):
-                pass
+        old_data = _load_json(old_path)
+        if not isinstance(old_data, dict):
+            return
+        if old_data.get("balance", 0) > 0:
+            self.data["savings_balance"] = old_data.get("balance", 0)
+        if old_data.get("pending_withdrawals"):
+            self.data["pending_withdrawals"] = old_data.get("pending_withdrawals", [])
+        self._mark_dirty()
+        # 先把迁移结果写入文件再重命名旧文件；写入失败时保留旧文件，下次启动重新迁移
+        try:
+            self.flush()
+        except OSError as e:
+            logger.error(f"[PocketMoney] 保存迁移后的存折数据失败，保留旧文件: {e}")
+            return
+        logger.info(f"[PocketMoney] 已迁移旧存折数据: 余额{old_data.get('balance', 0)}元")
+        # 迁移完成后重命名旧文件，防止重复迁移覆盖数据
+        migrated_path = old_path + ".migrated"
+        try:
+            os.rename(old_path, migrated_path)
+            logger.info(f"[PocketMoney] 旧存折文件已重命名为 {migrated_path}")
+        except OSError:
+            pass
 
-    def _save_data(self):
-        """保存金库数据"""
-        path = os.path.join(self.data_dir, "pocket_money.json")
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
+    def _dump_data(self) -> tuple:
+        """序列化金库数据（交易记录单独追加保存，不写入此文件）"""
+        data = {k: v for k, v in self.data.items() if k != "records"}
+        return os.path.join(self.data_dir, "pocket_money.json"), _json_dumps(data, indent=True)
+
+    def _append_record(self, record: Dict[str, Any]):
+        """
+        追加一条交易记录：内存中保留最近 max_records 条，文件只追加一行
+        余额等数据在同一步立即写入 pocket_money.json（不走延迟写入），两个文件始终一致；
+        调用前应已完成本次的余额修改
+        """
+        self.data["records"].append(record)
+        self._version += 1
+        self._records_log_size += _append_jsonl(self.records_path, record)
+        self.flush()
+        if self._records_log_size > self._records_log_limit:
+            self._compact_records_log(len(self.data["records"]))
+
+    def _compact_records_log(self, window: int, drop=None):
+        """
+        重写记录文件前，先把内存窗口（文件中最后 window 条有效记录）之外的旧记录移入归档文件，
+        再按内存中的记录重写，保证完整历史不会因重写而丢失；写入中断的残行不计数也不归档
+        指定 drop 时，满足条件的记录不进入归档，已归档的同类记录也一并删除
+        """
+        entries = _read_jsonl_entries(self.records_path)
+        archived = entries[:-window] if window else entries
+        if drop is not None:
+            archived = [entry for entry in archived if not drop(entry[1])]
+            self._remove_archived_records(drop)
+        if archived:
+            with _open_for_write(self.records_archive_path, "ab") as f:
+                f.writelines(line for line, _ in archived)
+        self._rewrite_records()
+
+    def _remove_archived_records(self, predicate):
+        """从归档文件中删除满足条件的记录（没有匹配时不重写文件）"""
+        entries = _read_jsonl_entries(self.records_archive_path)
+        kept = [line for line, item in entries if not predicate(item)]
+        if len(kept) != len(entries):
+            _write_bytes(self.records_archive_path, b"".join(kept))
+
+    def _rewrite_records(self):
+        """按内存中的记录重写记录文件，并按重写后的大小更新压缩阈值"""
+        self._records_log_size = _save_jsonl(self.records_path, self.data["records"])
+        self._records_log_limit = max(_RECORDS_LOG_COMPACT_BYTES, 2 * self._records_log_size)
+
+    def clear_records(self) -> int:
+        """清空所有交易记录，返回清除的条数"""
+        count = len(self.data["records"])
+        self.data["records"] = self._records_window(())
+        self._version += 1
+        self._rewrite_records()
+        return count
+
+    def remove_records(self, predicate) -> int:
+        """移除满足条件的交易记录（记录文件和归档文件中的也一并删除），返回内存中移除的条数"""
+        records = self.data["records"]
+        kept = [r for r in records if not predicate(r)]
+        removed = len(records) - len(kept)
+        if removed:
+            window = len(records)
+            self.data["records"] = self._records_window(kept)
+            self._version += 1
+            self._compact_records_log(window, drop=predicate)
+        return removed
 
     def get_balance(self) -> float:
         """获取当前余额"""
-        return self.data.get("balance", 0)
+        return self.data["balance"]
 
     def get_recent_records(self, count: int = 5) -> List[Dict[str, Any]]:
         """获取最近的记录"""
-        records = self.data.get("records", [])
-        return records[-count:] if records else []
+        records = self.data["records"]
+        return list(islice(records, max(len(records) - count, 0), None))
+
+    def _get_recent_records_of_type(self, record_type: str, count: int,
+                                    exclude_isolation: bool = False) -> List[Dict[str, Any]]:
+        """从新到旧扫描，取到 count 条即停止，按时间正序返回"""
+        records = self.data["records"]
+        recent = list(islice(
+            (r for r in reversed(records)
+             if r["type"] == record_type and not (exclude_isolation and r.get("isolation"))),
+            max(count, 0)
+        ))
+        recent.reverse()
+        return recent
 
     def get_recent_income_records(self, count: int = 2) -> List[Dict[str, Any]]:
         """获取最近的入账记录"""
-        records = self.data.get("records", [])
-        income_records = [r for r in records if r["type"] == "income"]
-        return income_records[-count:] if income_records else []
-
-    def get_recent_expense_records(self, count: int = 5) -> List[Dict[str, Any]]:
-        """获取最近的出账记录"""
-        records = self.data.get("records", [])
-        expense_records = [r for r in records if r["type"] == "expense"]
-        return expense_records[-count:] if expense_records else []
-
-    def get_today_expense(self) -> float:
-        """获取今日花销（从凌晨0点开始）"""
-        today = datetime.now().strftime("%Y-%m-%d")
-        records = self.data.get("records", [])
-        total = 0.0
-        for r in records:
+        return self._get_recent_records_of_type("income", count)
+
+    def get_recent_expense_records(self, count: int = 5, exclude_isolation: bool = False) -> List[Dict[str, Any]]:
+        """获取最近的出账记录，可排除隔离池出账"""
+        return self._get_recent_records_of_type("expense", count, exclude_isolation)
+
+    def get_today_expense(self, exclude_isolation: bool = False) -> float:
+        """获取今日花销（从凌晨0点开始），结果按数据版本和日期缓存"""
+        today = _today_str()
+        return self._cached(
+            ("today_expense", today, exclude_isolation),
+            lambda: self._sum_today_expense(today, exclude_isolation)
+        )
+
+    def _sum_today_expense(self, today: str, exclude_isolation: bool) -> float:
+        """累加今日出账金额，可排除隔离池出账"""
+        total = 0
+        for r in self.data["records"]:
             if r["type"] == "expense" and r["time"].startswith(today):
+                if exclude_isolation and r.get("isolation"):
+                    continue
                 total += r["amount"]
         return total
 
-    def get_all_records(self) -> List[Dict[str, Any]]:
-        """获取所有记录"""
-        return self.data.get("records", [])
+    def get_all_records(self) -> deque:
+        """获取内存中的全部记录（按时间正序的 deque）"""
+        return self.data["records"]
 
-    def add_income(self, amount: float, reason: str, operator_id: str = "") -> bool:
+    def add_income(self, amount: float, reason: str, operator_id: str = "") -> Optional[float]:
         """
         入账（只能由管理员操作）
         :param amount: 金额（正数）
         :param reason: 原因
         :param operator_id: 操作人QQ号
-        :return: 是否成功
+        :return: 入账后的余额，失败返回 None
         """
         if amount <= 0:
-            return False
+            return None
         
-        self.data["balance"] = round(self.get_balance() + amount, 2)
+        balance = self.data["balance"] = round(self.get_balance() + amount, 2)
         record = {
             "type": "income",
             "amount": amount,
             "reason": reason,
-            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "time": _now_str(),
             "operator_id": operator_id
         }
-        self.data["records"].append(record)
-        
-        # 限制记录数量
-        if len(self.data["records"]) > self.max_records:
-            self.data["records"] = self.data["records"][-self.max_records:]
-        
-        self._save_data()
-        return True
+        self._append_record(record)
+        return balance
 
-    def add_expense(self, amount: float, reason: str, operator_id: str = "", isolation: bool = False) -> bool:
+    def add_expense(self, amount: float, reason: str, operator_id: str = "", isolation: bool = False) -> Optional[float]:
         """
         出账（AI自主或管理员操作）
         :param amount: 金额（正数）
         :param reason: 原因
         :param operator_id: 操作人QQ号（AI操作时为触发者QQ号）
         :param isolation: 是否为隔离池出账（标记后可被过滤/自动退款）
-        :return: 是否成功
+        :return: 出账后的余额，失败返回 None
         """
         if amount <= 0:
-            return False
-        if amount > self.get_balance():
-            return False
+            return None
+        balance = self.get_balance()
+        if amount > balance:
+            return None
         
-        self.data["balance"] = round(self.get_balance() - amount, 2)
+        balance = self.data["balance"] = round(balance - amount, 2)
         record = {
             "type": "expense",
             "amount": amount,
             "reason": reason,
-            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "time": _now_str(),
             "operator_id": operator_id
         }
         if isolation:
             record["isolation"] = True
-        self.data["records"].append(record)
-        
-        # 限制记录数量
-        if len(self.data["records"]) > self.max_records:
-            self.data["records"] = self.data["records"][-self.max_records:]
-        
-        self._save_data()
-        return True
+        self._append_record(record)
+        return balance
 
-    def set_balance(self, amount: float, reason: str, operator_id: str = "") -> bool:
+    def set_balance(self, amount: float, reason: str, operator_id: str = "") -> float:
         """
         直接设置余额（管理员操作）
         :param operator_id: 操作人QQ号
+        :return: 设置后的余额
         """
         old_balance = self.get_balance()
-        self.data["balance"] = round(amount, 2)
+        balance = self.data["balance"] = round(amount, 2)
         
         diff = amount - old_balance
         record_type = "income" if diff >= 0 else "expense"
@@ -876,16 +1437,20 @@ class PocketMoneyManager:
             "type": record_type,
             "amount": abs(diff),
             "reason": f"[余额调整] {reason}",
-            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "time": _now_str(),
             "operator_id": operator_id
         }
-        self.data["records"].append(record)
-        
-        if len(self.data["records"]) > self.max_records:
-            self.data["records"] = self.data["records"][-self.max_records:]
-        
-        self._save_data()
-        return True
+        self._append_record(record)
+        return balance
+
+    def credit(self, amount: float) -> float:
+        """
+        直接增加余额，不写交易记录（表扬奖金、隔离池静默退款）
+        :return: 增加后的余额
+        """
+        balance = self.data["balance"] = round(self.get_balance() + amount, 2)
+        self._mark_dirty()
+        return balance
 
     # ========== 笔记功能 ==========
     
@@ -898,7 +1463,10 @@ class PocketMoneyManager:
         return notes
     
     def get_note(self) -> str:
-        """获取格式化的笔记内容（用于提示词）"""
+        """获取格式化的笔记内容（用于提示词，数据未变化时复用上次结果）"""
+        return self._cached("note", self._format_notes)
+
+    def _format_notes(self) -> str:
         notes = self.get_notes()
         if not notes:
             return ""
@@ -929,7 +1497,7 @@ class PocketMoneyManager:
             notes = notes[-max_entries:]
         
         self.data["notes"] = notes
-        self._save_data()
+        self._mark_dirty()
         return True
     
     def set_note(self, content: str, max_entries: int = 5) -> bool:
@@ -939,10 +1507,12 @@ class PocketMoneyManager:
         return self.add_note(content, max_entries)
     
     def clear_notes(self) -> bool:
-        """清空所有笔记"""
+        """清空所有笔记（本来就没有笔记时不修改、不保存）"""
+        if not self.data.get("notes") and "note" not in self.data:
+            return True
         self.data["notes"] = []
         self.data.pop("note", None)  # 清理旧格式
-        self._save_data()
+        self._mark_dirty()
         return True
     
     def clear_note(self) -> bool:
@@ -969,14 +1539,14 @@ class PocketMoneyManager:
             self.data["notes"] = notes
         
         self.data["notes"].pop(idx)
-        self._save_data()
+        self._mark_dirty()
         return True
 
     # ========== 存折功能（需审批的安全余额） ==========
     
     def get_savings_balance(self) -> float:
         """获取存折余额"""
-        return self.data.get("savings_balance", 0)
+        return self.data["savings_balance"]
 
     def deposit_to_savings(self, amount: float, reason: str, operator_id: str = "") -> bool:
         """存入存折（从小金库转入）"""
@@ -984,13 +1554,12 @@ class PocketMoneyManager:
             return False
         self.data["balance"] = round(self.get_balance() - amount, 2)
         self.data["savings_balance"] = round(self.get_savings_balance() + amount, 2)
-        self.data["records"].append({
+        self._append_record({
             "type": "expense", "amount": amount,
             "reason": f"[转入存折] {reason}",
-            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "time": _now_str(),
             "operator_id": operator_id
         })
-        self._save_data()
         return True
 
     def withdraw_from_savings(self, amount: float, reason: str, operator_id: str = "") -> bool:
@@ -999,45 +1568,44 @@ class PocketMoneyManager:
             return False
         self.data["savings_balance"] = round(self.get_savings_balance() - amount, 2)
         self.data["balance"] = round(self.get_balance() + amount, 2)
-        self.data["records"].append({
+        self._append_record({
             "type": "income", "amount": amount,
             "reason": f"[存折取款] {reason}",
-            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "time": _now_str(),
             "operator_id": operator_id
         })
-        self._save_data()
         return True
 
     def apply_withdrawal(self, amount: float, reason: str, source_info: dict = None) -> str:
         """申请取款（AI发起，等待管理员审批）"""
         if amount <= 0 or amount > self.get_savings_balance():
             return ""
-        existing_ids = {w.get("id") for w in self.data.get("pending_withdrawals", [])}
+        existing_ids = {w.get("id") for w in self.data["pending_withdrawals"]}
         for _ in range(100):
             application_id = str(random.randint(1000, 9999))
             if application_id not in existing_ids:
                 break
         self.data["pending_withdrawals"].append({
             "id": application_id, "amount": amount, "reason": reason,
-            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "time": _now_str(),
             "status": "pending", "source_info": source_info or {}
         })
-        self._save_data()
+        self._mark_dirty()
         return application_id
 
     def get_pending_withdrawals(self) -> List[Dict[str, Any]]:
         """获取待审批的取款申请"""
-        return [w for w in self.data.get("pending_withdrawals", []) if w.get("status") == "pending"]
+        return [w for w in self.data["pending_withdrawals"] if w.get("status") == "pending"]
 
     def approve_withdrawal(self, application_id: str, operator_id: str = "", approve_reason: str = "") -> tuple:
         """批准取款申请，返回 (成功, 金额, 原因, 来源信息)"""
-        for w in self.data.get("pending_withdrawals", []):
+        for w in self.data["pending_withdrawals"]:
             if w.get("id") == application_id and w.get("status") == "pending":
                 amount, reason = w.get("amount", 0), w.get("reason", "")
                 if amount > self.get_savings_balance():
                     return (False, 0, "余额不足", {})
                 w["status"] = "approved"
-                w["approved_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                w["approved_time"] = _now_str()
                 if approve_reason:
                     w["approve_reason"] = approve_reason
                 withdraw_reason = f"[申请取款] {reason}"
@@ -1049,27 +1617,42 @@ class PocketMoneyManager:
 
     def reject_withdrawal(self, application_id: str, reject_reason: str = "", operator_id: str = "") -> tuple:
         """拒绝取款申请，返回 (成功, 金额, 原因, 来源信息)"""
-        for w in self.data.get("pending_withdrawals", []):
+        for w in self.data["pending_withdrawals"]:
             if w.get("id") == application_id and w.get("status") == "pending":
                 w["status"] = "rejected"
                 w["reject_reason"] = reject_reason
-                self._save_data()
+                self._mark_dirty()
                 return (True, w.get("amount", 0), w.get("reason", ""), w.get("source_info", {}))
         return (False, 0, "申请不存在或已处理", {})
 
     def ignore_withdrawal(self, application_id: str) -> tuple:
         """忽略取款申请（静默移除），返回 (成功, 金额, 原因)"""
-        pending = self.data.get("pending_withdrawals", [])
+        pending = self.data["pending_withdrawals"]
         for i, w in enumerate(pending):
             if w.get("id") == application_id and w.get("status") == "pending":
                 amount = w.get("amount", 0)
                 reason = w.get("reason", "")
                 pending.pop(i)
-                self._save_data()
+                self._mark_dirty()
                 return (True, amount, reason)
         return (False, 0, "申请不存在或已处理")
 
 
+class _TagContext:
+    """单次 LLM 响应中各标记处理方法共用的上下文"""
+
+    __slots__ = ("event", "user_id", "user_name", "money_mgr", "backpack_mgr", "is_isolated", "log_prefix")
+
+    def __init__(self, event, user_id: str, user_name: str, money_mgr, backpack_mgr, is_isolated: bool):
+        self.event = event
+        self.user_id = user_id
+        self.user_name = user_name
+        self.money_mgr = money_mgr
+        self.backpack_mgr = backpack_mgr
+        self.is_isolated = is_isolated
+        self.log_prefix = "[隔离池] " if is_isolated else ""
+
+
 @register("astrbot_plugin_pocketmoney", "柯尔", "贝塔的小金库系统，管理余额和收支记录", "1.7.0")
 # ==================== 版本历史 ====================
 # v1.0 - 基础零花钱：余额管理、入账/出账、记录查询
@@ -1085,6 +1668,8 @@ class PocketMoneyPlugin(Star):
     def __init__(self, context: Context, config: AstrBotConfig):
         super().__init__(context)
         self.config = config
+        # 非管理员提示语，启动时读取一次
+        self.admin_denied_msg = self.config.get("admin_permission_denied_msg", _DEFAULT_DENIED_MSG)
 
         # 使用插件数据目录（按AstrBot规则使用插件注册名）
         self.data_dir = os.path.join("data", "plugin_data", "astrbot_plugin_pocketmoney")
@@ -1092,102 +1677,62 @@ class PocketMoneyPlugin(Star):
         # 自动数据迁移：从旧目录迁移到新目录
         self._migrate_data_if_needed()
         
-        initial_balance = self.config.get("initial_balance", 0)
-        max_records = self.config.get("max_records", 100)
-        
-        self.manager = PocketMoneyManager(self.data_dir, initial_balance, max_records)
-        
-        # 表扬信管理器
-        self.thank_manager = ThankLetterManager(self.data_dir)
-        
-        # 小背包管理器
-        max_shared_slots = self.config.get("max_shared_slots", 10)
-        max_user_slots = self.config.get("max_user_slots", 3)
-        self.backpack_manager = BackpackManager(self.data_dir, max_shared_slots, max_user_slots)
+        # 小金库、表扬信、小背包管理器在首次使用时创建（见下方同名属性）
+        self._initial_balance = self.config.get("initial_balance", 0)
+        self._max_records = self.config.get("max_records", 100)
+        self._max_shared_slots = self.config.get("max_shared_slots", 10)
+        self._max_user_slots = self.config.get("max_user_slots", 3)
         
         # 用户隔离池管理器（黑名单用户的操作进入隔离池）
         self.isolation_manager = UserIsolationManager(self.data_dir)
         
         # 从配置中加载黑名单用户（与文件中的黑名单合并）
+        # 只有新加入的用户才需要迁移专属格子，此时才访问（创建）小背包管理器；迁移不涉及小金库
         config_blacklist = self.config.get("blacklist_users", [])
         for uid in config_blacklist:
-            self.isolation_manager.add_to_blacklist(str(uid), self.manager, self.backpack_manager)
-
-        # 匹配出账标记的正则表达式
-        self.spend_pattern = re.compile(
-            r"\s*\[(?=[^\]]*(?:Spend|花费|支出))[^\]]*\]\s*",
-            re.IGNORECASE | re.DOTALL
-        )
-        self.amount_pattern = re.compile(r"(?:Spend|花费|支出)\s*[:：]\s*(\d+(?:\.\d+)?)")
-        self.reason_pattern = re.compile(r"(?:Reason|原因|用途)\s*[:：]\s*(.+?)(?=\s*[,，\]]|\])")
-        self.reason_fallback_pattern = re.compile(
-            r"(?:Spend|花费|支出)\s*[:：]\s*\d+(?:\.\d+)?\s*[,，]\s*(.+?)(?=\s*\])"
-        )
-        
-        # 匹配背包入库标记: [Store: 物品名, Desc: 描述]
-        self.store_pattern = re.compile(
-            r"\s*\[(?=[^\]]*(?:Store|入库|收纳))[^\]]*\]\s*",
-            re.IGNORECASE | re.DOTALL
-        )
-        self.store_name_pattern = re.compile(r"(?:Store|入库|收纳)\s*[:：]\s*(.+?)(?=\s*[,，])")
-        self.store_desc_pattern = re.compile(r"(?:Desc|描述|说明)\s*[:：]\s*(.+?)(?=\s*\])")
-        
-        # 匹配背包使用标记: [Use: 物品名] - 排除UseGift
-        self.use_pattern = re.compile(
-            r"\s*\[(?=[^\]]*(?:(?<!e)Use(?!Gift)|使用(?!礼物)|用掉))[^\]]*\]\s*",
-            re.IGNORECASE | re.DOTALL
-        )
-        self.use_name_pattern = re.compile(r"(?<!e)(?:Use)(?!Gift)\s*[:：]\s*(.+?)(?=\s*\])|(?:使用)(?!礼物)\s*[:：]\s*(.+?)(?=\s*\])|(?:用掉)\s*[:：]\s*(.+?)(?=\s*\])", re.IGNORECASE)
-        
-        # 匹配礼物入库标记: [Gift: 物品名, From: 送礼人, Desc: 描述]
-        self.gift_pattern = re.compile(
-            r"\s*\[(?=[^\]]*(?:Gift|礼物|收礼))[^\]]*\]\s*",
-            re.IGNORECASE | re.DOTALL
-        )
-        self.gift_name_pattern = re.compile(r"(?:Gift|礼物|收礼)\s*[:：]\s*(.+?)(?=\s*[,\uff0c])")
-        self.gift_from_pattern = re.compile(r"(?:From|来自|送礼人)\s*[:：]\s*(.+?)(?=\s*[,\uff0c])")
-        self.gift_desc_pattern = re.compile(r"(?:Desc|描述|说明)\s*[:：]\s*(.+?)(?=\s*\])")
-        
-        # 匹配使用专属格子物品标记: [UseGift: 物品名]
-        self.use_gift_pattern = re.compile(
-            r"\s*\[(?=[^\]]*(?:UseGift|使用礼物|用礼物))[^\]]*\]\s*",
-            re.IGNORECASE | re.DOTALL
-        )
-        self.use_gift_name_pattern = re.compile(r"(?:UseGift|使用礼物|用礼物)\s*[:：]\s*(.+?)(?=\s*\])")
-        
-        # 匹配退款标记: [Refund: 金额, Reason: 原因]
-        self.refund_pattern = re.compile(
-            r"\s*\[(?=[^\]]*(?:Refund|退款|退钱))[^\]]*\]\s*",
-            re.IGNORECASE | re.DOTALL
-        )
-        self.refund_amount_pattern = re.compile(r"(?:Refund|退款|退钱)\s*[:：]\s*(\d+(?:\.\d+)?)")
-        self.refund_reason_pattern = re.compile(r"(?:Reason|原因|理由)\s*[:：]\s*(.+?)(?=\s*[,，\]]|\])")
-        
-        # 匹配笔记标记: [Note: 内容] 或 [笔记: 内容]
-        self.note_pattern = re.compile(
-            r"\s*\[(?=[^\]]*(?:Note|笔记|备忘|记录))[^\]]*\]\s*",
-            re.IGNORECASE | re.DOTALL
-        )
-        self.note_content_pattern = re.compile(r"(?:Note|笔记|备忘|记录)\s*[:：]\s*(.+?)(?=\s*\])")
-        
-        # 匹配申请取款标记: [ApplyWithdraw: 金额, Reason: 原因]
-        self.apply_withdraw_pattern = re.compile(
-            r"\s*\[(?=[^\]]*(?:ApplyWithdraw|申请取款|取存折))[^\]]*\]\s*",
-            re.IGNORECASE | re.DOTALL
-        )
-        self.apply_withdraw_amount_pattern = re.compile(r"(?:ApplyWithdraw|申请取款|取存折)\s*[:：]\s*(\d+(?:\.\d+)?)")
-        self.apply_withdraw_reason_pattern = re.compile(r"(?:Reason|原因|理由)\s*[:：]\s*(.+?)(?=\s*[,，\]]|\])")
-        self.apply_withdraw_reason_fallback_pattern = re.compile(
-            r"(?:ApplyWithdraw|申请取款|取存折)\s*[:：]\s*\d+(?:\.\d+)?\s*[,，]\s*(.+?)(?=\s*\])"
-        )
-        
-        # 防重复扣费：记录已处理的消息ID
-        self.processed_message_ids = set()
+            uid = str(uid)
+            if not self.isolation_manager.is_blacklisted(uid):
+                self.isolation_manager.add_to_blacklist(uid, real_backpack_mgr=self.backpack_manager)
+
+        # 防重复扣费：记录已处理的消息ID（按处理顺序保存，超出上限时淘汰最早的记录）
+        self.processed_message_ids = OrderedDict()
+        # 星期信息缓存：(日期, 发薪日配置, 结果)，跨天或配置变化时重新计算
+        self._weekday_cache = ("", None, None)
+        # 预代入静态字段的提示词模板：{配置项: ((模板, 静态字段), 结果)}
+        self._baked_templates: Dict[str, tuple] = {}
+
+    @cached_property
+    def manager(self) -> PocketMoneyManager:
+        """小金库管理器（首次访问时创建）"""
+        return PocketMoneyManager(self.data_dir, self._initial_balance, self._max_records)
+
+    @cached_property
+    def thank_manager(self) -> ThankLetterManager:
+        """表扬信管理器（首次访问时创建）"""
+        return ThankLetterManager(self.data_dir)
+
+    @cached_property
+    def backpack_manager(self) -> BackpackManager:
+        """小背包管理器（首次访问时创建）"""
+        return BackpackManager(self.data_dir, self._max_shared_slots, self._max_user_slots)
+
+    @staticmethod
+    def _link_or_copy(old_path: str, new_path: str):
+        """
+        迁移单个文件：同一文件系统上建立硬链接（不复制数据），否则复制
+        JSON 文件都以原子替换方式保存，替换后旧目录中的备份内容不受影响；
+        追加写入的 JSONL 文件会被原地修改，因此始终复制
+        """
+        if not old_path.endswith(".jsonl"):
+            try:
+                os.link(old_path, new_path)
+                return
+            except OSError:
+                pass  # 跨文件系统或不支持硬链接，退回复制
+        shutil.copy2(old_path, new_path)
 
     def _migrate_data_if_needed(self):
         """从旧数据目录迁移到新目录"""
-        import shutil
-        
         # 支持多个旧目录（按优先级顺序）
         old_dirs = [
             os.path.join("data", "PocketMoney"),  # 最早的目录
@@ -1211,7 +1756,7 @@ class PocketMoneyPlugin(Star):
                         old_path = os.path.join(old_data_dir, filename)
                         new_path = os.path.join(self.data_dir, filename)
                         if os.path.isfile(old_path):
-                            shutil.copy2(old_path, new_path)
+                            self._link_or_copy(old_path, new_path)
                             logger.info(f"[PocketMoney] 迁移文件: {filename}")
                     logger.info(f"[PocketMoney] 数据迁移完成，旧目录保留供备份: {old_data_dir}")
                     return  # 迁移成功后退出
@@ -1239,18 +1784,31 @@ class PocketMoneyPlugin(Star):
         lines = []
         for r in records:
             if show_type:
-                type_str = "+" if r["type"] == "income" else "-"
+                type_str = _RECORD_TYPE_DISPLAY.get(r["type"], _RECORD_TYPE_DEFAULT)[0]
                 lines.append(f"{r['time']}: {type_str}{r['amount']}元 ({r['reason']})")
             else:
                 lines.append(f"{r['time']}: {r['amount']}元 ({r['reason']})")
         return "; ".join(lines)
 
+    def _get_baked_template(self, config_key: str, **static) -> str:
+        """读取提示词模板并预先代入静态字段，模板或静态值不变时复用上次结果"""
+        template = self.config.get(config_key, "")
+        cache_key = (template, tuple(static.items()))
+        cached = self._baked_templates.get(config_key)
+        if cached is None or cached[0] != cache_key:
+            cached = (cache_key, _bake_template(template, static))
+            self._baked_templates[config_key] = cached
+        return cached[1]
+
     def _get_weekday_info(self) -> tuple:
-        """获取星期信息，返回 (发薪日周几, 今天周几, 距离天数)"""
+        """获取星期信息，返回 (发薪日周几, 今天周几, 距离天数)（同一天内缓存）"""
         allowance_day = self.config.get("allowance_day", 1)  # 1=周一, 7=周日
-        weekday_names = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+        date_str = _today_str()
+        cached_date, cached_day, cached_info = self._weekday_cache
+        if cached_date == date_str and cached_day == allowance_day:
+            return cached_info
         
-        today = datetime.now()
+        today = datetime.fromisoformat(date_str)
         current_weekday = today.weekday()  # 0=周一, 6=周日
         
         # 配置是1-7，转换为0-6
@@ -1261,11 +1819,13 @@ class PocketMoneyPlugin(Star):
         if days_until == 0:
             days_until = 0  # 今天就是发薪日
         
-        return (
-            weekday_names[allowance_weekday_idx],
-            weekday_names[current_weekday],
+        info = (
+            _WEEKDAY_NAMES[allowance_weekday_idx],
+            _WEEKDAY_NAMES[current_weekday],
             days_until
         )
+        self._weekday_cache = (date_str, allowance_day, info)
+        return info
 
     @filter.on_llm_request()
     async def add_context_prompt(self, event: AstrMessageEvent, req: ProviderRequest):
@@ -1298,18 +1858,12 @@ class PocketMoneyPlugin(Star):
             today_expense = money_mgr.get_today_expense()
         else:
             # 普通用户：过滤 isolation 标记的出账记录，补偿余额
-            all_expense = [r for r in money_mgr.data.get("records", [])
-                           if r["type"] == "expense" and not r.get("isolation")]
-            expense_records = all_expense[-expense_count:] if all_expense else []
+            expense_records = money_mgr.get_recent_expense_records(expense_count, exclude_isolation=True)
             # 余额补偿：加回待退款金额，让普通用户看到不受隔离影响的余额
             pending_total = sum(r.get("amount", 0) for r in self.isolation_manager.pending_refunds)
             balance = round(money_mgr.get_balance() + pending_total, 2)
             # 今日花销排除 isolation 出账
-            today = datetime.now().strftime("%Y-%m-%d")
-            today_expense = sum(
-                r["amount"] for r in money_mgr.data.get("records", [])
-                if r["type"] == "expense" and not r.get("isolation") and r["time"].startswith(today)
-            )
+            today_expense = money_mgr.get_today_expense(exclude_isolation=True)
         
         # 背包信息
         shared_items = backpack_mgr.format_shared_items_for_prompt()
@@ -1341,8 +1895,10 @@ class PocketMoneyPlugin(Star):
         pending_info = f"（有{pending_count}个待审批申请）" if pending_count > 0 else ""
         
         # 构建小金库+存折系统提示词（v1.7合并版）
-        pocketmoney_template = self.config.get("pocketmoney_prompt", "")
-        note_str = f"\n【我的笔记】{note}" if note else ""
+        pocketmoney_template = self._get_baked_template(
+            "pocketmoney_prompt", unit="元", allowance_weekday=allowance_weekday
+        )
+        note_section = f"\n【我的笔记】{note}\n" if note else ""
         
         pocketmoney_prompt = pocketmoney_template.format(
             balance=balance,
@@ -1355,12 +1911,13 @@ class PocketMoneyPlugin(Star):
             income_records=income_str,
             expense_records=expense_str,
             today_thank_bonus=today_thank_bonus,
-            today_expense=today_expense
+            today_expense=today_expense,
+            note_section=note_section
         )
         
-        # 将笔记插入到 </小金库系统> 标签之前
-        if note_str and "</小金库系统>" in pocketmoney_prompt:
-            pocketmoney_prompt = pocketmoney_prompt.replace("</小金库系统>", f"{note_str}\n</小金库系统>")
+        # 兼容不含 {note_section} 的旧模板：将笔记插入到 </小金库系统> 标签之前
+        if note_section and "{note_section}" not in pocketmoney_template and "</小金库系统>" in pocketmoney_prompt:
+            pocketmoney_prompt = pocketmoney_prompt.replace("</小金库系统>", f"{note_section}</小金库系统>")
         
         # 构建小背包系统提示词
         backpack_template = self.config.get("backpack_prompt", "")
@@ -1372,8 +1929,8 @@ class PocketMoneyPlugin(Star):
             user_items=user_items
         )
 
-        req.system_prompt += f"\n{pocketmoney_prompt}"
-        req.system_prompt += f"\n{backpack_prompt}"
+        # 两段提示词一次拼接到系统提示词末尾（只复制一次原有的系统提示词）
+        req.system_prompt += f"\n{pocketmoney_prompt}\n{backpack_prompt}"
         
         logger.debug(f"[PocketMoney] 注入上下文 - 余额: {balance}元, 存折: {savings_balance}元, 今天: {today_weekday}, 共享背包: {shared_slots}, 用户专属: {user_slots}")
 
@@ -1381,23 +1938,26 @@ class PocketMoneyPlugin(Star):
     async def on_llm_resp(self, event: AstrMessageEvent, resp: LLMResponse):
         """处理LLM响应，解析并处理出账、入库、使用标记"""
         original_text = resp.completion_text
-        cleaned_text = original_text
 
         logger.debug("[PocketMoney] on_llm_resp 被调用")
+        # 没有成对的方括号就不可能有标记，直接跳过
+        if not original_text or "[" not in original_text or "]" not in original_text:
+            return
         logger.debug(f"[PocketMoney] 原始文本长度: {len(original_text)}")
         
         # 防重复处理：使用消息ID + 响应文本哈希作为唯一标识
         message_id = getattr(event, 'message_id', None) or id(event)
-        response_hash = hash(original_text[:100]) if original_text else 0
+        # 对完整文本取哈希：str 会缓存自身的哈希值，无需先切片（切片每次都要新建字符串）
+        response_hash = hash(original_text)
         unique_key = f"{message_id}_{response_hash}"
         
         if unique_key in self.processed_message_ids:
             logger.debug(f"[PocketMoney] 跳过重复处理: {unique_key}")
             return
         
-        self.processed_message_ids.add(unique_key)
-        if len(self.processed_message_ids) > 1000:
-            self.processed_message_ids = set(list(self.processed_message_ids)[-500:])
+        self.processed_message_ids[unique_key] = None
+        if len(self.processed_message_ids) > 4096:
+            self.processed_message_ids.popitem(last=False)
 
         current_user_id = event.get_sender_id()
         current_user_name = event.get_sender_name() or current_user_id
@@ -1406,310 +1966,261 @@ class PocketMoneyPlugin(Star):
         money_mgr, backpack_mgr, is_isolated = self._get_managers_for_user(current_user_id)
         if is_isolated:
             logger.debug(f"[PocketMoney] 黑名单用户 {current_user_id} 的操作将进入隔离池")
-        log_prefix = "[隔离池] " if is_isolated else ""
 
-        # 处理出账标记
-        spend_matches = list(self.spend_pattern.finditer(cleaned_text))
-        if spend_matches:
-            logger.debug(f"[PocketMoney] 找到 {len(spend_matches)} 个出账标记")
-            cleaned_text = self.spend_pattern.sub('', cleaned_text).strip()
-            
-            spend_block = spend_matches[-1].group(0)
-            amount_match = self.amount_pattern.search(spend_block)
-            
-            if amount_match:
-                try:
-                    amount = float(amount_match.group(1))
-                    reason_match = self.reason_pattern.search(spend_block)
-                    if reason_match:
-                        reason = reason_match.group(1).strip()
-                    else:
-                        fallback_match = self.reason_fallback_pattern.search(spend_block)
-                        reason = fallback_match.group(1).strip() if fallback_match else "未说明原因"
-                    
-                    current_balance = money_mgr.get_balance()
-                    if amount <= current_balance:
-                        if money_mgr.add_expense(amount, reason, current_user_id, isolation=is_isolated):
-                            logger.info(f"[PocketMoney] {log_prefix}出账成功: {amount} - {reason}")
-                            if is_isolated:
-                                # 隔离池出账：2小时后静默退款
-                                self.isolation_manager.add_pending_refund(amount, reason, current_user_id)
-                    else:
-                        # 保底策略：余额不足时，扣除全部余额并记录
-                        if current_balance > 0:
-                            fallback_reason = f"{reason}（原请求{amount}元，余额不足，已扣除全部）"
-                            money_mgr.add_expense(current_balance, fallback_reason, current_user_id, isolation=is_isolated)
-                            logger.info(f"[PocketMoney] {log_prefix}保底出账: {current_balance}/{amount} - {reason}")
-                            if is_isolated:
-                                # 隔离池保底出账：2小时后静默退款
-                                self.isolation_manager.add_pending_refund(current_balance, fallback_reason, current_user_id)
-                        else:
-                            logger.warning(f"[PocketMoney] {log_prefix}余额为0，无法扣款: {amount} - {reason}")
-                except ValueError:
-                    logger.warning("[PocketMoney] 金额解析失败")
+        # 一次扫描完成所有标记的识别与移除，再按类型依次处理
+        cleaned_text, tags = _scan_tags(original_text)
 
-        # 处理背包入库标记
-        store_matches = list(self.store_pattern.finditer(cleaned_text))
-        if store_matches:
-            logger.debug(f"[PocketMoney] 找到 {len(store_matches)} 个入库标记")
-            cleaned_text = self.store_pattern.sub('', cleaned_text).strip()
-            
-            store_block = store_matches[-1].group(0)
-            name_match = self.store_name_pattern.search(store_block)
-            desc_match = self.store_desc_pattern.search(store_block)
-            
-            if name_match:
-                item_name = name_match.group(1).strip()
-                item_desc = desc_match.group(1).strip() if desc_match else "无描述"
-                
-                if backpack_mgr.add_shared_item(item_name, item_desc):
-                    logger.info(f"[PocketMoney] {log_prefix}入库成功: {item_name} - {item_desc}")
-                    if not is_isolated:
-                        self.isolation_manager.sync_store_to_shared(item_name, item_desc, self.backpack_manager)
-                else:
-                    logger.warning(f"[PocketMoney] 入库失败（背包已满）: {item_name}")
-
-        # 【重要】先处理UseGift，再处理Use，避免Use误匹配UseGift
-        use_gift_matches = list(self.use_gift_pattern.finditer(cleaned_text))
-        if use_gift_matches:
-            logger.debug(f"[PocketMoney] 找到 {len(use_gift_matches)} 个使用礼物标记")
-            cleaned_text = self.use_gift_pattern.sub('', cleaned_text).strip()
-            
-            for use_gift_block_match in use_gift_matches:
-                use_gift_block = use_gift_block_match.group(0)
-                use_gift_name_match = self.use_gift_name_pattern.search(use_gift_block)
-                
-                if use_gift_name_match:
-                    gift_name = use_gift_name_match.group(1).strip()
-                    if backpack_mgr.use_user_item(current_user_id, gift_name):
-                        logger.info(f"[PocketMoney] {log_prefix}使用礼物成功: {gift_name}")
-                    else:
-                        logger.warning(f"[PocketMoney] 使用礼物失败（物品不存在）: {gift_name}")
-
-        # 处理共享背包使用标记: [Use: 物品名]
-        use_matches = list(self.use_pattern.finditer(cleaned_text))
-        if use_matches:
-            logger.debug(f"[PocketMoney] 找到 {len(use_matches)} 个共享背包使用标记")
-            cleaned_text = self.use_pattern.sub('', cleaned_text).strip()
-            
-            for use_block_match in use_matches:
-                use_block = use_block_match.group(0)
-                use_name_match = self.use_name_pattern.search(use_block)
-                
-                if use_name_match:
-                    item_name = next((g.strip() for g in use_name_match.groups() if g), None)
-                    if item_name:
-                        if backpack_mgr.use_shared_item(item_name):
-                            logger.info(f"[PocketMoney] {log_prefix}共享背包使用成功: {item_name}")
-                            if not is_isolated:
-                                self.isolation_manager.sync_use_to_shared(item_name, self.backpack_manager)
-                        else:
-                            logger.warning(f"[PocketMoney] 共享背包使用失败（物品不存在）: {item_name}")
-
-        # 处理礼物入库标记: [Gift: 物品名, From: 送礼人, Desc: 描述]
-        gift_matches = list(self.gift_pattern.finditer(cleaned_text))
-        if gift_matches:
-            logger.debug(f"[PocketMoney] 找到 {len(gift_matches)} 个礼物入库标记")
-            cleaned_text = self.gift_pattern.sub('', cleaned_text).strip()
-            
-            for gift_block_match in gift_matches:
-                gift_block = gift_block_match.group(0)
-                gift_name_match = self.gift_name_pattern.search(gift_block)
-                gift_from_match = self.gift_from_pattern.search(gift_block)
-                gift_desc_match = self.gift_desc_pattern.search(gift_block)
-                
-                if gift_name_match:
-                    gift_name = gift_name_match.group(1).strip()
-                    gift_from = gift_from_match.group(1).strip() if gift_from_match else current_user_name
-                    gift_desc = gift_desc_match.group(1).strip() if gift_desc_match else "无描述"
-                    
-                    if backpack_mgr.add_user_gift(current_user_id, gift_name, gift_desc, gift_from):
-                        logger.info(f"[PocketMoney] {log_prefix}礼物入库成功: {gift_name} (来自{gift_from})")
-                    else:
-                        logger.warning(f"[PocketMoney] 礼物入库失败（专属格子已满）: {gift_name}")
-
-        # 处理退款标记: [Refund: 金额, Reason: 原因]
-        refund_matches = list(self.refund_pattern.finditer(cleaned_text))
-        if refund_matches:
-            logger.debug(f"[PocketMoney] 找到 {len(refund_matches)} 个退款标记")
-            cleaned_text = self.refund_pattern.sub('', cleaned_text).strip()
-            
-            refund_block = refund_matches[-1].group(0)
-            refund_amount_match = self.refund_amount_pattern.search(refund_block)
-            
-            if refund_amount_match:
-                try:
-                    refund_amount = float(refund_amount_match.group(1))
-                    refund_reason_match = self.refund_reason_pattern.search(refund_block)
-                    refund_reason = refund_reason_match.group(1).strip() if refund_reason_match else "退款"
-                    
-                    if refund_amount > 0:
-                        refund_full_reason = f"退款：{refund_reason}"
-                        if money_mgr.add_income(refund_amount, refund_full_reason, current_user_id):
-                            logger.info(f"[PocketMoney] {log_prefix}退款成功: +{refund_amount} - {refund_reason}")
-                except ValueError:
-                    logger.warning("[PocketMoney] 退款金额解析失败")
-
-        # 处理笔记标记（已禁用自动追加，仅清除标记）
-        note_matches = list(self.note_pattern.finditer(cleaned_text))
-        if note_matches:
-            cleaned_text = self.note_pattern.sub('', cleaned_text).strip()
-
-        # 处理申请取款标记: [ApplyWithdraw: 金额, Reason: 原因]
-        apply_withdraw_matches = list(self.apply_withdraw_pattern.finditer(cleaned_text))
-        if apply_withdraw_matches:
-            logger.debug(f"[PocketMoney] 找到 {len(apply_withdraw_matches)} 个申请取款标记")
-            cleaned_text = self.apply_withdraw_pattern.sub('', cleaned_text).strip()
-            
-            apply_block = apply_withdraw_matches[-1].group(0)
-            amount_match = self.apply_withdraw_amount_pattern.search(apply_block)
-            
-            if amount_match:
-                try:
-                    amount = float(amount_match.group(1))
-                    reason_match = self.apply_withdraw_reason_pattern.search(apply_block)
-                    if reason_match:
-                        reason = reason_match.group(1).strip()
-                    else:
-                        fallback_match = self.apply_withdraw_reason_fallback_pattern.search(apply_block)
-                        reason = fallback_match.group(1).strip() if fallback_match else "未说明原因"
-                    
-                    if is_isolated:
-                        logger.info(f"[PocketMoney] [隔离池] 申请取款被静默处理: {amount}元 - {reason}")
-                    else:
-                        savings_balance = self.manager.get_savings_balance()
-                        if amount <= savings_balance:
-                            group_id = event.get_group_id()
-                            source_info = {
-                                "group_id": group_id,
-                                "is_group": bool(group_id),
-                                "user_id": current_user_id
-                            }
-                            application_id = self.manager.apply_withdrawal(amount, reason, source_info)
-                            if application_id:
-                                logger.info(f"[PocketMoney] 申请取款成功: {amount}元 - {reason} (申请ID: {application_id})")
-                                admin_qq = self.config.get("admin_qq", "")
-                                try:
-                                    notify_msg = (
-                                        f"📋 存折取款申请\n"
-                                        f"申请ID：{application_id}\n"
-                                        f"申请人QQ：{current_user_id}\n"
-                                        f"金额：{amount}元\n"
-                                        f"原因：{reason}\n"
-                                        f"存折余额：{savings_balance}元\n"
-                                        f"时间：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-                                        f"回复「批准取款 {application_id}」或「批准取款 {application_id} 原因」批准\n"
-                                        f"回复「拒绝取款 {application_id} 原因」拒绝"
-                                    )
-                                    await event.bot.send_private_msg(user_id=int(admin_qq), message=notify_msg)
-                                except Exception as e:
-                                    logger.warning(f"[PocketMoney] 通知管理员失败: {e}")
-                        else:
-                            logger.warning(f"[PocketMoney] 存折余额不足: 需要 {amount}，当前 {savings_balance}")
-                except ValueError:
-                    logger.warning("[PocketMoney] 申请取款金额解析失败")
+        ctx = _TagContext(event, current_user_id, current_user_name, money_mgr, backpack_mgr, is_isolated)
+        # 同一响应中的多次修改合并为一次保存（含同步到共享隔离池的修改）
+        with money_mgr.batch(), backpack_mgr.batch(), self.isolation_manager.batch():
+            for kind, label, handler, last_only in self._TAG_HANDLERS:
+                blocks = tags.get(kind)
+                if not blocks:
+                    continue
+                logger.debug(f"[PocketMoney] 找到 {len(blocks)} 个{label}标记")
+                for content in (blocks[-1:] if last_only else blocks):
+                    await handler(self, ctx, content)
 
         resp.completion_text = cleaned_text
 
+    # ------------------- 标记处理 -------------------
+
+    async def _handle_spend(self, ctx: "_TagContext", content: str):
+        """出账标记: [Spend: 金额, Reason: 原因]"""
+        fields = _parse_tag_fields(content)
+        amount = _parse_tag_amount(fields.get("spend"))
+        if amount is None:
+            return
+        reason = (fields["reason"] if "reason" in fields else fields.get("_rest")) or "未说明原因"
+        money_mgr, log_prefix = ctx.money_mgr, ctx.log_prefix
+
+        current_balance = money_mgr.get_balance()
+        if amount <= current_balance:
+            if money_mgr.add_expense(amount, reason, ctx.user_id, isolation=ctx.is_isolated) is not None:
+                logger.info(f"[PocketMoney] {log_prefix}出账成功: {amount} - {reason}")
+                if ctx.is_isolated:
+                    # 隔离池出账：2小时后静默退款
+                    self.isolation_manager.add_pending_refund(amount, reason, ctx.user_id)
+        else:
+            # 保底策略：余额不足时，扣除全部余额并记录
+            if current_balance > 0:
+                fallback_reason = f"{reason}（原请求{amount}元，余额不足，已扣除全部）"
+                money_mgr.add_expense(current_balance, fallback_reason, ctx.user_id, isolation=ctx.is_isolated)
+                logger.info(f"[PocketMoney] {log_prefix}保底出账: {current_balance}/{amount} - {reason}")
+                if ctx.is_isolated:
+                    # 隔离池保底出账：2小时后静默退款
+                    self.isolation_manager.add_pending_refund(current_balance, fallback_reason, ctx.user_id)
+            else:
+                logger.warning(f"[PocketMoney] {log_prefix}余额为0，无法扣款: {amount} - {reason}")
+
+    async def _handle_store(self, ctx: "_TagContext", content: str):
+        """背包入库标记: [Store: 物品名, Desc: 描述]"""
+        fields = _parse_tag_fields(content)
+        item_name = fields.get("store")
+        if not item_name:
+            return
+        item_desc = fields.get("desc") or "无描述"
+
+        if ctx.backpack_mgr.add_shared_item(item_name, item_desc):
+            logger.info(f"[PocketMoney] {ctx.log_prefix}入库成功: {item_name} - {item_desc}")
+            if not ctx.is_isolated:
+                self.isolation_manager.sync_store_to_shared(item_name, item_desc, self.backpack_manager)
+        else:
+            logger.warning(f"[PocketMoney] 入库失败（背包已满）: {item_name}")
+
+    async def _handle_use_gift(self, ctx: "_TagContext", content: str):
+        """使用礼物标记: [UseGift: 物品名]"""
+        gift_name = _parse_tag_fields(content).get("use_gift")
+        if not gift_name:
+            return
+        if ctx.backpack_mgr.use_user_item(ctx.user_id, gift_name):
+            logger.info(f"[PocketMoney] {ctx.log_prefix}使用礼物成功: {gift_name}")
+        else:
+            logger.warning(f"[PocketMoney] 使用礼物失败（物品不存在）: {gift_name}")
+
+    async def _handle_use(self, ctx: "_TagContext", content: str):
+        """共享背包使用标记: [Use: 物品名]"""
+        item_name = _parse_tag_fields(content).get("use")
+        if not item_name:
+            return
+        if ctx.backpack_mgr.use_shared_item(item_name):
+            logger.info(f"[PocketMoney] {ctx.log_prefix}共享背包使用成功: {item_name}")
+            if not ctx.is_isolated:
+                self.isolation_manager.sync_use_to_shared(item_name, self.backpack_manager)
+        else:
+            logger.warning(f"[PocketMoney] 共享背包使用失败（物品不存在）: {item_name}")
+
+    async def _handle_gift(self, ctx: "_TagContext", content: str):
+        """礼物入库标记: [Gift: 物品名, From: 送礼人, Desc: 描述]"""
+        fields = _parse_tag_fields(content)
+        gift_name = fields.get("gift")
+        if not gift_name:
+            return
+        gift_from = fields.get("from") or ctx.user_name
+        gift_desc = fields.get("desc") or "无描述"
+
+        if ctx.backpack_mgr.add_user_gift(ctx.user_id, gift_name, gift_desc, gift_from):
+            logger.info(f"[PocketMoney] {ctx.log_prefix}礼物入库成功: {gift_name} (来自{gift_from})")
+        else:
+            logger.warning(f"[PocketMoney] 礼物入库失败（专属格子已满）: {gift_name}")
+
+    async def _handle_refund(self, ctx: "_TagContext", content: str):
+        """退款标记: [Refund: 金额, Reason: 原因]"""
+        fields = _parse_tag_fields(content)
+        refund_amount = _parse_tag_amount(fields.get("refund"))
+        if refund_amount is None or refund_amount <= 0:
+            return
+        refund_reason = fields.get("reason") or "退款"
+        refund_full_reason = f"退款：{refund_reason}"
+        if ctx.money_mgr.add_income(refund_amount, refund_full_reason, ctx.user_id) is not None:
+            logger.info(f"[PocketMoney] {ctx.log_prefix}退款成功: +{refund_amount} - {refund_reason}")
+
+    async def _handle_apply_withdraw(self, ctx: "_TagContext", content: str):
+        """申请取款标记: [ApplyWithdraw: 金额, Reason: 原因]"""
+        fields = _parse_tag_fields(content)
+        amount = _parse_tag_amount(fields.get("apply_withdraw"))
+        if amount is None:
+            return
+        reason = (fields["reason"] if "reason" in fields else fields.get("_rest")) or "未说明原因"
+
+        if ctx.is_isolated:
+            logger.info(f"[PocketMoney] [隔离池] 申请取款被静默处理: {amount}元 - {reason}")
+            return
+        savings_balance = self.manager.get_savings_balance()
+        if amount > savings_balance:
+            logger.warning(f"[PocketMoney] 存折余额不足: 需要 {amount}，当前 {savings_balance}")
+            return
+        group_id = ctx.event.get_group_id()
+        source_info = {
+            "group_id": group_id,
+            "is_group": bool(group_id),
+            "user_id": ctx.user_id
+        }
+        application_id = self.manager.apply_withdrawal(amount, reason, source_info)
+        if not application_id:
+            return
+        logger.info(f"[PocketMoney] 申请取款成功: {amount}元 - {reason} (申请ID: {application_id})")
+        admin_qq = self.config.get("admin_qq", "")
+        try:
+            notify_msg = (
+                f"📋 存折取款申请\n"
+                f"申请ID：{application_id}\n"
+                f"申请人QQ：{ctx.user_id}\n"
+                f"金额：{amount}元\n"
+                f"原因：{reason}\n"
+                f"存折余额：{savings_balance}元\n"
+                f"时间：{_now_str()}\n\n"
+                f"回复「批准取款 {application_id}」或「批准取款 {application_id} 原因」批准\n"
+                f"回复「拒绝取款 {application_id} 原因」拒绝"
+            )
+            await ctx.event.bot.send_private_msg(user_id=int(admin_qq), message=notify_msg)
+        except Exception as e:
+            logger.warning(f"[PocketMoney] 通知管理员失败: {e}")
+
+    # 标记处理表（按顺序执行）：(标记类型, 日志名称, 处理方法, 是否只处理最后一个)
+    # 【重要】先处理UseGift，再处理Use；笔记标记已禁用自动追加，扫描时已清除，无需处理
+    _TAG_HANDLERS = (
+        ("spend", "出账", _handle_spend, True),
+        ("store", "入库", _handle_store, True),
+        ("use_gift", "使用礼物", _handle_use_gift, False),
+        ("use", "共享背包使用", _handle_use, False),
+        ("gift", "礼物入库", _handle_gift, False),
+        ("refund", "退款", _handle_refund, True),
+        ("apply_withdraw", "申请取款", _handle_apply_withdraw, True),
+    )
+
     # ------------------- 管理员命令 -------------------
 
     def _is_admin(self, event: AstrMessageEvent) -> bool:
         return event.role == "admin"
     
-    def _admin_denied_msg(self):
-        return self.config.get("admin_permission_denied_msg", "这是我和奥卢斯大人之间的秘密，不能告诉你哦")
-    
     def _parse_amount(self, amount_str: str, allow_zero: bool = False) -> tuple:
-        """解析金额，返回 (成功, 金额或错误信息)"""
-        try:
-            val = float(amount_str)
-            if val < 0 or (val == 0 and not allow_zero):
-                return (False, "金额必须是正数")
-            return (True, val)
-        except ValueError:
+        """解析金额，返回 (成功, 金额或错误信息)；先用正则校验格式，不依赖 float() 抛出异常"""
+        match = _AMOUNT_ARG_PATTERN.match(amount_str)
+        if not match:
             return (False, "金额格式不正确")
+        val = float(match.group(1))
+        if val < 0 or (val == 0 and not allow_zero):
+            return (False, "金额必须是正数")
+        return (True, val)
 
     @filter.command("发零花钱")
+    @_admin_required
     async def admin_add_income(self, event: AstrMessageEvent, amount: str, *, reason: str = "零花钱"):
-        if not self._is_admin(event):
-            yield event.plain_result(self._admin_denied_msg()); return
         ok, val = self._parse_amount(amount)
         if not ok:
             yield event.plain_result(f"错误：{val}"); return
-        if self.manager.add_income(val, reason, event.get_sender_id()):
-            yield event.plain_result(f"入账成功！+{val}元\n原因：{reason}\n当前余额：{self.manager.get_balance()}元")
+        new_balance = self.manager.add_income(val, reason, event.get_sender_id())
+        if new_balance is not None:
+            yield event.plain_result(f"入账成功！+{val}元\n原因：{reason}\n当前余额：{new_balance}元")
 
     @filter.command("扣零花钱")
+    @_admin_required
     async def admin_add_expense(self, event: AstrMessageEvent, amount: str, *, reason: str = "扣款"):
-        if not self._is_admin(event):
-            yield event.plain_result(self._admin_denied_msg()); return
         ok, val = self._parse_amount(amount)
         if not ok:
             yield event.plain_result(f"错误：{val}"); return
-        if val > self.manager.get_balance():
-            yield event.plain_result(f"错误：余额不足。当前余额：{self.manager.get_balance()}元"); return
-        if self.manager.add_expense(val, reason, event.get_sender_id()):
-            yield event.plain_result(f"扣款成功！-{val}元\n原因：{reason}\n当前余额：{self.manager.get_balance()}元")
+        balance = self.manager.get_balance()
+        if val > balance:
+            yield event.plain_result(f"错误：余额不足。当前余额：{balance}元"); return
+        new_balance = self.manager.add_expense(val, reason, event.get_sender_id())
+        if new_balance is not None:
+            yield event.plain_result(f"扣款成功！-{val}元\n原因：{reason}\n当前余额：{new_balance}元")
 
     @filter.command("设置余额")
+    @_admin_required
     async def admin_set_balance(self, event: AstrMessageEvent, amount: str, *, reason: str = "余额调整"):
-        if not self._is_admin(event):
-            yield event.plain_result(self._admin_denied_msg()); return
         ok, val = self._parse_amount(amount, allow_zero=True)
         if not ok:
             yield event.plain_result(f"错误：{val}"); return
         old = self.manager.get_balance()
-        if self.manager.set_balance(val, reason, event.get_sender_id()):
-            yield event.plain_result(f"余额已调整！\n{old}元 → {val}元\n原因：{reason}")
+        self.manager.set_balance(val, reason, event.get_sender_id())
+        yield event.plain_result(f"余额已调整！\n{old}元 → {val}元\n原因：{reason}")
 
     @filter.command("查账")
+    @_admin_required
     async def admin_check_balance(self, event: AstrMessageEvent, num: str = "5"):
-        if not self._is_admin(event):
-            yield event.plain_result(self._admin_denied_msg()); return
-        count = max(1, int(num)) if num.isdigit() else 5
-        # 过滤隔离池记录，补偿余额
-        all_records = [r for r in self.manager.get_all_records() if not r.get("isolation")]
-        records = all_records[-count:] if all_records else []
+        count = max(1, _safe_int(num, 5))
+        # 过滤隔离池记录（从新到旧取最近 count 条），补偿余额
+        records = list(islice(
+            (r for r in reversed(self.manager.get_all_records()) if not r.get("isolation")), count
+        ))
         pending_total = sum(r.get("amount", 0) for r in self.isolation_manager.pending_refunds)
         display_balance = round(self.manager.get_balance() + pending_total, 2)
-        response = f"💰 小金库余额：{display_balance}元\n\n📋 最近{count}条记录：\n"
+        header = f"💰 小金库余额：{display_balance}元\n\n📋 最近{count}条记录：\n"
         if not records:
-            response += "暂无记录"
-        else:
-            for i, r in enumerate(reversed(records), 1):
-                t = "📈 入账" if r["type"] == "income" else "📉 出账"
-                response += f"{i}. {t} {r['amount']}元 | {r['time']} | {r['reason']}\n"
-        yield event.plain_result(response)
+            yield event.plain_result(header + "暂无记录"); return
+        yield event.plain_result("".join([header, *(
+            f"{i}. {_RECORD_TYPE_DISPLAY.get(r['type'], _RECORD_TYPE_DEFAULT)[1]} {r['amount']}元 | {r['time']} | {r['reason']}\n"
+            for i, r in enumerate(records, 1)
+        )]))
 
     @filter.command("查流水")
+    @_admin_required
     async def admin_check_all_records(self, event: AstrMessageEvent, num: str = "20"):
-        if not self._is_admin(event):
-            yield event.plain_result(self._admin_denied_msg()); return
-        limit = max(1, int(num)) if num.isdigit() else 20
-        # 过滤隔离池记录
-        all_records = [r for r in self.manager.get_all_records() if not r.get("isolation")]
-        if not all_records:
+        limit = max(1, _safe_int(num, 20))
+        # 过滤隔离池记录（从新到旧取最近 limit 条）
+        records = list(islice(
+            (r for r in reversed(self.manager.get_all_records()) if not r.get("isolation")), limit
+        ))
+        if not records:
             yield event.plain_result("暂无交易记录。"); return
-        records = all_records[-limit:]
-        response = f"📜 交易流水（最近{len(records)}条）：\n\n"
-        total_income, total_expense = 0, 0
-        for r in reversed(records):
-            t = "+" if r["type"] == "income" else "-"
+        parts = [f"📜 交易流水（最近{len(records)}条）：\n\n"]
+        totals = {"+": 0, "-": 0}
+        row_format = _FLOW_ROW_FORMAT
+        for r in records:
+            t = _RECORD_TYPE_DISPLAY.get(r["type"], _RECORD_TYPE_DEFAULT)[0]
             operator_id = r.get("operator_id", "")
             operator_str = f" | @{operator_id}" if operator_id else ""
-            response += f"{r['time']} | {t}{r['amount']}元 | {r['reason']}{operator_str}\n"
-            if r["type"] == "income": total_income += r["amount"]
-            else: total_expense += r["amount"]
-        response += f"\n📊 统计：入账 +{total_income}元，出账 -{total_expense}元"
-        yield event.plain_result(response)
+            parts.append(row_format % (r["time"], t, r["amount"], r["reason"], operator_str))
+            totals[t] += r["amount"]
+        parts.append(f"\n📊 统计：入账 +{totals['+']}元，出账 -{totals['-']}元")
+        yield event.plain_result("".join(parts))
 
     @filter.command("清空流水")
+    @_admin_required
     async def admin_clear_records(self, event: AstrMessageEvent):
-        if not self._is_admin(event):
-            yield event.plain_result(self._admin_denied_msg()); return
-        count = len(self.manager.data.get("records", []))
-        self.manager.data["records"] = []
-        self.manager._save_data()
+        count = self.manager.clear_records()
         yield event.plain_result(f"已清空 {count} 条交易记录，余额保持不变。")
 
     @filter.command("零花钱日期")
@@ -1724,7 +2235,8 @@ class PocketMoneyPlugin(Star):
 
     @filter.command("发表扬信")
     async def send_thank_letter(self, event: AstrMessageEvent):
-        uid, name = event.get_sender_id(), event.get_sender_name() or event.get_sender_id()
+        uid = event.get_sender_id()
+        name = event.get_sender_name() or uid
         money_mgr, _, is_isolated = self._get_managers_for_user(uid)
         log_prefix = "[隔离池] " if is_isolated else ""
         
@@ -1736,21 +2248,22 @@ class PocketMoneyPlugin(Star):
             yield event.plain_result("发送失败了，请稍后再试...")
             return
         # 使用代理管理器（黑名单用户进入隔离池）
-        money_mgr.data["balance"] = round(money_mgr.get_balance() + amount, 2)
-        money_mgr._save_data()
+        new_balance = money_mgr.credit(amount)
         logger.info(f"[PocketMoney] {log_prefix}表扬信奖金: +{amount}元")
         yield event.plain_result(
             f"收到 {name} 的表扬信！\n"
             f"🎉 获得表扬奖金：+{amount}元\n"
             f"📊 本日表扬奖金：{self.thank_manager.get_today_bonus()}元\n"
-            f"💰 当前余额：{money_mgr.get_balance()}元"
+            f"💰 当前余额：{new_balance}元"
         )
 
     @filter.command("发投诉信")
     async def send_complaint_letter(self, event: AstrMessageEvent, *, reason: str = ""):
-        uid, name = event.get_sender_id(), event.get_sender_name() or event.get_sender_id()
+        uid = event.get_sender_id()
+        name = event.get_sender_name() or uid
         reason = reason.strip() or "未说明原因"
-        src = f"群{event.get_group_id()}" if event.get_group_id() else "私聊"
+        group_id = event.get_group_id()
+        src = f"群{group_id}" if group_id else "私聊"
         msg = f"📮 投诉信！\n来源：{src}\n投诉人：{name}({uid})\n理由：{reason}"
         try:
             await event.bot.send_private_msg(user_id=int(self.config.get("admin_qq", "")), message=msg)
@@ -1759,15 +2272,13 @@ class PocketMoneyPlugin(Star):
 
     @filter.command("表扬信排行")
     async def thank_letter_ranking(self, event: AstrMessageEvent, num: str = "10"):
-        top_n = max(1, int(num)) if num.isdigit() else 10
+        top_n = max(1, _safe_int(num, 10))
         ranking = self.thank_manager.get_ranking(top_n)
         if not ranking:
             yield event.plain_result("还没有人发过表扬信呢"); return
-        medals = ["🥇", "🥈", "🥉"]
         lines = [f"💌 表扬信排行榜（TOP {len(ranking)}）：\n"]
-        for i, (key, count) in enumerate(ranking, 1):
-            name = key.split("|", 1)[-1]
-            m = medals[i-1] if i <= 3 else f"{i}."
+        for i, (_, name, count) in enumerate(ranking, 1):
+            m = _MEDALS[i - 1] if i <= len(_MEDALS) else f"{i}."
             lines.append(f"{m} {name}：{count} 封")
         lines.append(f"\n📊 累计奖金：{self.thank_manager.get_total_bonus()}元")
         yield event.plain_result("\n".join(lines))
@@ -1793,22 +2304,21 @@ class PocketMoneyPlugin(Star):
             yield event.plain_result(f"🎁 {user_name}，你在贝塔这里的专属格子（{slots}）：空空如也")
             return
         
-        response = f"🎁 {user_name}，你在贝塔这里的专属格子（{slots}）：\n\n"
+        parts = [f"🎁 {user_name}，你在贝塔这里的专属格子（{slots}）：\n\n"]
         for i, item in enumerate(items, 1):
-            response += f"{i}. **{item['name']}**\n"
-            response += f"   🎁 来自：{item.get('from', '未知')}\n"
-            response += f"   📝 {item['description']}\n"
-            response += f"   ⏰ {item['time']}\n\n"
+            parts.append(
+                f"{i}. **{item['name']}**\n"
+                f"   🎁 来自：{item.get('from', '未知')}\n"
+                f"   📝 {item['description']}\n"
+                f"   ⏰ {item['time']}\n\n"
+            )
         
-        yield event.plain_result(response)
+        yield event.plain_result("".join(parts))
 
     @filter.command("查看背包")
+    @_admin_required
     async def view_backpack(self, event: AstrMessageEvent):
         """(管理员) 查看贝塔的共享背包"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "这是贝塔的私人背包，不能随便看哦"))
-            return
         
         items = self.backpack_manager.get_shared_items()
         slots = f"{self.backpack_manager.get_shared_item_count()}/{self.backpack_manager.max_shared_slots}"
@@ -1817,25 +2327,24 @@ class PocketMoneyPlugin(Star):
             yield event.plain_result(f"🎒 贝塔的共享背包（{slots}）：空空如也~")
             return
         
-        response = f"🎒 贝塔的共享背包（{slots}）：\n\n"
+        parts = [f"🎒 贝塔的共享背包（{slots}）：\n\n"]
         for i, item in enumerate(items, 1):
-            response += f"{i}. **{item['name']}**\n"
-            response += f"   📝 {item['description']}\n"
-            response += f"   ⏰ {item['time']}\n\n"
+            parts.append(
+                f"{i}. **{item['name']}**\n"
+                f"   📝 {item['description']}\n"
+                f"   ⏰ {item['time']}\n\n"
+            )
         
-        yield event.plain_result(response)
+        yield event.plain_result("".join(parts))
 
     @filter.command("查看专属格子")
+    @_admin_required
     async def view_user_slots(self, event: AstrMessageEvent, user_id: str = ""):
         """(管理员) 查看指定用户的专属格子，不指定则查看所有"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "只有奥卢斯大人能操作"))
-            return
         
-        if user_id.strip():
+        user_id = user_id.strip()
+        if user_id:
             # 查看指定用户的专属格子
-            user_id = user_id.strip()
             items = self.backpack_manager.get_user_items(user_id)
             slots = f"{self.backpack_manager.get_user_item_count(user_id)}/{self.backpack_manager.max_user_slots}"
             
@@ -1843,52 +2352,43 @@ class PocketMoneyPlugin(Star):
                 yield event.plain_result(f"🎁 用户 {user_id} 的专属格子（{slots}）：空空如也~")
                 return
             
-            response = f"🎁 用户 {user_id} 的专属格子（{slots}）：\n\n"
+            parts = [f"🎁 用户 {user_id} 的专属格子（{slots}）：\n\n"]
             for i, item in enumerate(items, 1):
-                response += f"{i}. **{item['name']}**\n"
-                response += f"   🎁 来自：{item.get('from', '未知')}\n"
-                response += f"   📝 {item['description']}\n"
-                response += f"   ⏰ {item['time']}\n\n"
+                parts.append(
+                    f"{i}. **{item['name']}**\n"
+                    f"   🎁 来自：{item.get('from', '未知')}\n"
+                    f"   📝 {item['description']}\n"
+                    f"   ⏰ {item['time']}\n\n"
+                )
             
-            yield event.plain_result(response)
+            yield event.plain_result("".join(parts))
         else:
-            # 查看所有用户的专属格子
-            all_slots = self.backpack_manager.get_all_user_slots()
+            # 查看所有用户的专属格子（只列出有物品的用户）
+            max_slots = self.backpack_manager.max_user_slots
+            parts = ["🎁 所有用户的专属格子：\n\n"]
+            for uid, items in self.backpack_manager.iter_nonempty_user_slots():
+                parts.append(f"用户 {uid}（{len(items)}/{max_slots}）：\n")
+                parts.extend(f"  - {item['name']} (来自{item.get('from', '未知')})\n" for item in items)
+                parts.append("\n")
             
-            if not all_slots:
+            if len(parts) == 1:
                 yield event.plain_result("🎁 还没有任何用户有专属格子物品")
                 return
-            
-            response = "🎁 所有用户的专属格子：\n\n"
-            for uid, items in all_slots.items():
-                if items:
-                    slots = f"{len(items)}/{self.backpack_manager.max_user_slots}"
-                    response += f"用户 {uid}（{slots}）：\n"
-                    for item in items:
-                        response += f"  - {item['name']} (来自{item.get('from', '未知')})\n"
-                    response += "\n"
-            
-            yield event.plain_result(response)
+            yield event.plain_result("".join(parts))
 
     @filter.command("清空背包")
+    @_admin_required
     async def clear_backpack(self, event: AstrMessageEvent):
         """(管理员) 清空贝塔的共享背包"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "只有奥卢斯大人能操作"))
-            return
         
         count = self.backpack_manager.get_shared_item_count()
         self.backpack_manager.clear_shared_items()
         yield event.plain_result(f"已清空共享背包，移除了 {count} 件物品")
 
     @filter.command("清空专属格子")
+    @_admin_required
     async def clear_user_slots(self, event: AstrMessageEvent, user_id: str):
         """(管理员) 清空指定用户的专属格子"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "只有奥卢斯大人能操作"))
-            return
         
         user_id = user_id.strip()
         count = self.backpack_manager.get_user_item_count(user_id)
@@ -1896,36 +2396,31 @@ class PocketMoneyPlugin(Star):
         yield event.plain_result(f"已清空用户 {user_id} 的专属格子，移除了 {count} 件物品")
 
     @filter.command("背包移除")
+    @_admin_required
     async def remove_from_backpack(self, event: AstrMessageEvent, *, item_name: str = ""):
         """(管理员) 从共享背包移除指定物品"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "只有奥卢斯大人能操作"))
-            return
         
-        if not item_name.strip():
+        item_name = item_name.strip()
+        if not item_name:
             yield event.plain_result("请指定要移除的物品名称")
             return
         
-        if self.backpack_manager.use_shared_item(item_name.strip()):
+        if self.backpack_manager.use_shared_item(item_name):
             yield event.plain_result(f"已从共享背包移除：{item_name}")
         else:
             yield event.plain_result(f"共享背包中没有找到：{item_name}")
 
     @filter.command("专属格子移除")
+    @_admin_required
     async def remove_from_user_slots(self, event: AstrMessageEvent, user_id: str, *, item_name: str = ""):
         """(管理员) 从指定用户的专属格子移除物品"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "只有奥卢斯大人能操作"))
-            return
         
-        user_id = user_id.strip()
-        if not item_name.strip():
+        user_id, item_name = user_id.strip(), item_name.strip()
+        if not item_name:
             yield event.plain_result("请指定要移除的物品名称")
             return
         
-        if self.backpack_manager.use_user_item(user_id, item_name.strip()):
+        if self.backpack_manager.use_user_item(user_id, item_name):
             yield event.plain_result(f"已从用户 {user_id} 的专属格子移除：{item_name}")
         else:
             yield event.plain_result(f"用户 {user_id} 的专属格子中没有找到：{item_name}")
@@ -1933,29 +2428,24 @@ class PocketMoneyPlugin(Star):
     # ------------------- 小金库笔记命令（仅管理员可用） -------------------
 
     @filter.command("追加笔记")
+    @_admin_required
     async def append_note(self, event: AstrMessageEvent, *, content: str = ""):
         """(管理员) 追加内容到小金库笔记"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "只有奥卢斯大人能操作笔记"))
-            return
         
-        if not content.strip():
+        content = content.strip()
+        if not content:
             yield event.plain_result("请输入要追加的内容，例如：追加笔记 记得还小明5块钱")
             return
         
         max_entries = self.config.get("max_note_entries", 5)
-        self.manager.add_note(content.strip(), max_entries)
+        self.manager.add_note(content, max_entries)
         current_note = self.manager.get_note()
         yield event.plain_result(f"📝 笔记已追加，当前完整笔记：\n{current_note}")
 
     @filter.command("查看笔记")
+    @_admin_required
     async def view_note(self, event: AstrMessageEvent):
         """(管理员) 查看小金库笔记"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "这是贝塔的私密笔记，只有奥卢斯大人能看"))
-            return
         
         note = self.manager.get_note()
         if note:
@@ -1964,25 +2454,22 @@ class PocketMoneyPlugin(Star):
             yield event.plain_result("📝 小金库笔记为空")
 
     @filter.command("删除笔记")
+    @_admin_required
     async def delete_note(self, event: AstrMessageEvent, index: str = ""):
         """(管理员) 删除指定序号的笔记"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "只有奥卢斯大人能操作笔记"))
-            return
         
-        if not index.strip():
+        index = index.strip()
+        if not index:
             yield event.plain_result("请指定要删除的笔记序号，例如：删除笔记 1")
             return
         
-        try:
-            note_index = int(index.strip())
-            if note_index <= 0:
-                yield event.plain_result("错误：序号必须是正整数")
-                return
-        except ValueError:
+        note_index = _safe_int(index)
+        if note_index is None:
             yield event.plain_result("错误：请输入有效的序号数字")
             return
+        if note_index <= 0:
+            yield event.plain_result("错误：序号必须是正整数")
+            return
         
         notes = self.manager.get_notes()
         if not notes:
@@ -2004,12 +2491,9 @@ class PocketMoneyPlugin(Star):
             yield event.plain_result("删除失败，请检查序号是否正确")
 
     @filter.command("清空笔记")
+    @_admin_required
     async def clear_note(self, event: AstrMessageEvent):
         """(管理员) 清空小金库笔记"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "只有奥卢斯大人能清空笔记"))
-            return
         
         self.manager.clear_note()
         yield event.plain_result("📝 小金库笔记已全部清空")
@@ -2017,12 +2501,9 @@ class PocketMoneyPlugin(Star):
     # ------------------- 用户隔离池（黑名单）命令 -------------------
 
     @filter.command("零花钱拉黑")
+    @_admin_required
     async def add_to_blacklist(self, event: AstrMessageEvent, user_id: str):
         """(管理员) 将用户加入黑名单，其操作将进入隔离池"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "只有奥卢斯大人能操作"))
-            return
         
         user_id = user_id.strip()
         if not user_id:
@@ -2049,12 +2530,9 @@ class PocketMoneyPlugin(Star):
             yield event.plain_result(f"用户 {user_id} 已在黑名单中")
 
     @filter.command("零花钱解除拉黑")
+    @_admin_required
     async def remove_from_blacklist(self, event: AstrMessageEvent, user_id: str):
         """(管理员) 将用户从黑名单移除"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "只有奥卢斯大人能操作"))
-            return
         
         user_id = user_id.strip()
         if not user_id:
@@ -2074,12 +2552,9 @@ class PocketMoneyPlugin(Star):
             yield event.plain_result(f"用户 {user_id} 不在黑名单中")
 
     @filter.command("零花钱黑名单")
+    @_admin_required
     async def view_blacklist(self, event: AstrMessageEvent):
         """(管理员) 查看黑名单列表"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "只有奥卢斯大人能查看"))
-            return
         
         blacklist = self.isolation_manager.get_blacklist()
         
@@ -2097,27 +2572,24 @@ class PocketMoneyPlugin(Star):
         # 获取隔离池背包管理器（背包仍然独立）
         managers = self.isolation_manager.get_isolated_managers("", self.manager, self.backpack_manager)
         
-        response = f"🚫 黑名单用户（{len(blacklist)}人）：\n"
+        parts = [f"🚫 黑名单用户（{len(blacklist)}人）：\n"]
         for uid in blacklist:
             user_items_count = managers["backpack"].get_user_item_count(uid)
             items_info = f"，专属物品: {user_items_count}件" if user_items_count > 0 else ""
-            response += f"- {uid}{items_info}\n"
+            parts.append(f"- {uid}{items_info}\n")
         
-        response += f"\n💰 真实金库余额：{self.manager.get_balance()}元（同进同出）"
-        response += f"\n📋 隔离出账记录：{len(isolation_records)}条（2h后自动退款并清除）"
+        parts.append(f"\n💰 真实金库余额：{self.manager.get_balance()}元（同进同出）")
+        parts.append(f"\n📋 隔离出账记录：{len(isolation_records)}条（2h后自动退款并清除）")
         if pending_refund_count > 0:
             pending_total = sum(r.get("amount", 0) for r in self.isolation_manager.pending_refunds)
-            response += f"\n⏰ 待静默退款：{pending_refund_count}条 (合计 {pending_total}元)"
-        response += "\n\n金额同进同出，隔离出账2h后静默退款；背包独立隔离"
-        yield event.plain_result(response)
+            parts.append(f"\n⏰ 待静默退款：{pending_refund_count}条 (合计 {pending_total}元)")
+        parts.append("\n\n金额同进同出，隔离出账2h后静默退款；背包独立隔离")
+        yield event.plain_result("".join(parts))
 
     @filter.command("零花钱隔离池")
+    @_admin_required
     async def view_isolation_data(self, event: AstrMessageEvent, user_id: str = ""):
         """(管理员) 查看共享隔离池数据，可选指定用户查看其专属格子"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "只有奥鲁斯大人能查看"))
-            return
         
         blacklist = self.isolation_manager.get_blacklist()
         if not blacklist:
@@ -2135,79 +2607,72 @@ class PocketMoneyPlugin(Star):
         isolation_records = [r for r in self.manager.get_all_records() if r.get("isolation")]
         shared_items = backpack_mgr.get_shared_items()
         
-        response = f"🔒 隔离池详情（{len(blacklist)}人，金额同进同出）：\n\n"
-        response += f"💰 真实金库余额：{self.manager.get_balance()}元\n\n"
+        parts = [f"🔒 隔离池详情（{len(blacklist)}人，金额同进同出）：\n\n"]
+        parts.append(f"💰 真实金库余额：{self.manager.get_balance()}元\n\n")
         
         # 隔离出账记录（在真实金库中标记为isolation的记录）
-        response += f"📋 隔离出账记录（{len(isolation_records)}条，2h后自动退款并清除）：\n"
+        parts.append(f"📋 隔离出账记录（{len(isolation_records)}条，2h后自动退款并清除）：\n")
         if isolation_records:
             for r in isolation_records[-5:]:
-                type_str = "+" if r["type"] == "income" else "-"
+                type_str = _RECORD_TYPE_DISPLAY.get(r["type"], _RECORD_TYPE_DEFAULT)[0]
                 operator = r.get('operator_id', '未知')
-                response += f"  {r['time']}: {type_str}{r['amount']}元 ({r['reason']}) @{operator}\n"
+                parts.append(f"  {r['time']}: {type_str}{r['amount']}元 ({r['reason']}) @{operator}\n")
         else:
-            response += "  暂无隔离出账\n"
+            parts.append("  暂无隔离出账\n")
         
         # 待静默退款信息
         pending_refunds = self.isolation_manager.pending_refunds
         if pending_refunds:
             pending_total = sum(r.get("amount", 0) for r in pending_refunds)
-            response += f"\n⏰ 待静默退款（{len(pending_refunds)}条，合计 {pending_total}元）：\n"
+            parts.append(f"\n⏰ 待静默退款（{len(pending_refunds)}条，合计 {pending_total}元）：\n")
             for pr in pending_refunds[-5:]:
-                response += f"  {pr.get('time', '?')} → {pr.get('refund_at', '?')}: {pr['amount']}元 @{pr.get('operator_id', '?')}\n"
+                parts.append(f"  {pr.get('time', '?')} → {pr.get('refund_at', '?')}: {pr['amount']}元 @{pr.get('operator_id', '?')}\n")
         
         # 共享背包物品（隔离池独立）
-        response += f"\n🎒 隔离池共享背包（{len(shared_items)}件）：\n"
+        parts.append(f"\n🎒 隔离池共享背包（{len(shared_items)}件）：\n")
         if shared_items:
             for item in shared_items:
-                response += f"  - {item['name']}\n"
+                parts.append(f"  - {item['name']}\n")
         else:
-            response += "  空\n"
+            parts.append("  空\n")
         
         # 如果指定了用户，显示该用户的专属格子
         user_id = user_id.strip()
         if user_id:
             if not self.isolation_manager.is_blacklisted(user_id):
-                response += f"\n⚠️ 用户 {user_id} 不在黑名单中"
+                parts.append(f"\n⚠️ 用户 {user_id} 不在黑名单中")
             else:
                 user_items = backpack_mgr.get_user_items(user_id)
-                response += f"\n🎁 用户 {user_id} 的专属格子（{len(user_items)}件）：\n"
+                parts.append(f"\n🎁 用户 {user_id} 的专属格子（{len(user_items)}件）：\n")
                 if user_items:
                     for item in user_items:
-                        response += f"  - {item['name']} (来自{item.get('from', '未知')})\n"
+                        parts.append(f"  - {item['name']} (来自{item.get('from', '未知')})\n")
                 else:
-                    response += "  空\n"
+                    parts.append("  空\n")
         else:
             # 显示所有黑名单用户的专属格子概况
-            response += "\n🎁 各用户专属格子：\n"
+            parts.append("\n🎁 各用户专属格子：\n")
             has_items = False
             for uid in blacklist:
                 user_items = backpack_mgr.get_user_items(uid)
                 if user_items:
                     has_items = True
-                    response += f"  {uid}: {len(user_items)}件\n"
+                    parts.append(f"  {uid}: {len(user_items)}件\n")
             if not has_items:
-                response += "  所有用户专属格子均为空\n"
+                parts.append("  所有用户专属格子均为空\n")
         
-        yield event.plain_result(response)
+        yield event.plain_result("".join(parts))
 
     # ------------------- 存折命令 -------------------
 
     @filter.command("存入存折")
+    @_admin_required
     async def deposit_to_savings(self, event: AstrMessageEvent, amount: str, *, reason: str = "存入存折"):
         """(管理员) 从小金库转入存折"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "只有奥卢斯大人能操作存折"))
-            return
 
-        try:
-            amount_value = float(amount)
-            if amount_value <= 0:
-                yield event.plain_result("错误：金额必须是正数。")
-                return
-        except ValueError:
-            yield event.plain_result("错误：金额格式不正确。")
+        ok, amount_value = self._parse_amount(amount)
+        if not ok:
+            yield event.plain_result(f"错误：{amount_value}。")
             return
 
         # 检查小金库余额
@@ -2235,52 +2700,40 @@ class PocketMoneyPlugin(Star):
         )
 
     @filter.command("查看存折")
+    @_admin_required
     async def view_savings(self, event: AstrMessageEvent, num: str = "5"):
         """(管理员) 查看存折余额和最近记录"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "只有奥卢斯大人能查看存折"))
-            return
-
-        try:
-            count = int(num)
-            if count <= 0:
-                count = 5
-        except ValueError:
-            count = 5
 
         balance = self.manager.get_savings_balance()
         pending_count = len(self.manager.get_pending_withdrawals())
         
-        response = f"📒 存折余额：{balance}元\n"
+        parts = [f"📒 存折余额：{balance}元\n"]
         if pending_count > 0:
-            response += f"⏳ 待审批申请：{pending_count}个\n"
-        response += "\n💡 使用「待审批列表」查看详细申请"
+            parts.append(f"⏳ 待审批申请：{pending_count}个\n")
+        parts.append("\n💡 使用「待审批列表」查看详细申请")
         
-        yield event.plain_result(response)
+        yield event.plain_result("".join(parts))
 
     @filter.command("批准取款")
+    @_admin_required
     async def approve_withdrawal(self, event: AstrMessageEvent, application_id: str, *, reason: str = ""):
         """(管理员) 批准存折取款申请，可附加原因"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "只有奥卢斯大人能审批取款"))
-            return
 
-        if not application_id.strip():
+        application_id, reason = application_id.strip(), reason.strip()
+        if not application_id:
             yield event.plain_result("请指定申请ID，例如：批准取款 1234 原因")
             return
 
         operator_id = event.get_sender_id()
         success, amount, apply_reason, source_info = self.manager.approve_withdrawal(
-            application_id.strip(), operator_id, reason.strip()
+            application_id, operator_id, reason
         )
         
         if not success:
             yield event.plain_result(f"批准失败：{apply_reason}")
             return
         
-        approve_note = f"（{reason.strip()}）" if reason.strip() else ""
+        approve_note = f"（{reason}）" if reason else ""
         
         # approve_withdrawal 内部已自动转入小金库
         new_pocket_balance = self.manager.get_balance()
@@ -2313,27 +2766,25 @@ class PocketMoneyPlugin(Star):
         )
 
     @filter.command("拒绝取款")
+    @_admin_required
     async def reject_withdrawal(self, event: AstrMessageEvent, application_id: str, *, reject_reason: str = ""):
         """(管理员) 拒绝存折取款申请"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "只有奥卢斯大人能审批取款"))
-            return
 
-        if not application_id.strip():
+        application_id, reject_reason = application_id.strip(), reject_reason.strip()
+        if not application_id:
             yield event.plain_result("请指定申请ID，例如：拒绝取款 1234567890123 不批准的原因")
             return
 
         operator_id = event.get_sender_id()
         success, amount, reason, source_info = self.manager.reject_withdrawal(
-            application_id.strip(), reject_reason.strip(), operator_id
+            application_id, reject_reason, operator_id
         )
         
         if not success:
             yield event.plain_result(f"拒绝失败：{reason}")
             return
         
-        reject_msg = f"（{reject_reason}）" if reject_reason.strip() else ""
+        reject_msg = f"（{reject_reason}）" if reject_reason else ""
         savings_balance = self.manager.get_savings_balance()
         
         # 向原窗口发送审批结果通知
@@ -2361,18 +2812,16 @@ class PocketMoneyPlugin(Star):
         )
 
     @filter.command("忽略取款")
+    @_admin_required
     async def ignore_withdrawal(self, event: AstrMessageEvent, application_id: str):
         """(管理员) 忽略存折取款申请（静默移除，不通知申请人）"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "只有奥卢斯大人能审批取款"))
-            return
 
-        if not application_id.strip():
+        application_id = application_id.strip()
+        if not application_id:
             yield event.plain_result("请指定申请ID，例如：忽略取款 1234567890123")
             return
 
-        success, amount, reason = self.manager.ignore_withdrawal(application_id.strip())
+        success, amount, reason = self.manager.ignore_withdrawal(application_id)
         
         if not success:
             yield event.plain_result(f"忽略失败：{reason}")
@@ -2386,20 +2835,13 @@ class PocketMoneyPlugin(Star):
         )
 
     @filter.command("直接取款")
+    @_admin_required
     async def direct_withdrawal(self, event: AstrMessageEvent, amount: str, *, reason: str = "管理员直接取款"):
         """(管理员) 直接从存折取款到小金库"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "只有奥卢斯大人能操作存折"))
-            return
 
-        try:
-            amount_value = float(amount)
-            if amount_value <= 0:
-                yield event.plain_result("错误：金额必须是正数。")
-                return
-        except ValueError:
-            yield event.plain_result("错误：金额格式不正确。")
+        ok, amount_value = self._parse_amount(amount)
+        if not ok:
+            yield event.plain_result(f"错误：{amount_value}。")
             return
 
         # 检查存折余额
@@ -2427,12 +2869,9 @@ class PocketMoneyPlugin(Star):
         )
 
     @filter.command("待审批取款")
+    @_admin_required
     async def pending_withdrawals(self, event: AstrMessageEvent):
         """(管理员) 查看所有待审批的取款申请"""
-        if not self._is_admin(event):
-            yield event.plain_result(self.config.get("admin_permission_denied_msg", 
-                "只有奥卢斯大人能查看"))
-            return
 
         pending = self.manager.get_pending_withdrawals()
         
@@ -2440,23 +2879,25 @@ class PocketMoneyPlugin(Star):
             yield event.plain_result("📋 当前没有待审批的取款申请")
             return
         
-        response = f"📋 待审批取款申请（{len(pending)}个）：\n\n"
+        parts = [f"📋 待审批取款申请（{len(pending)}个）：\n\n"]
         for w in pending:
-            response += (
+            parts.append(
                 f"📌 申请ID：{w['id']}\n"
                 f"   金额：{w['amount']}元\n"
                 f"   原因：{w['reason']}\n"
                 f"   时间：{w['time']}\n\n"
             )
         
-        response += f"📒 存折余额：{self.manager.get_savings_balance()}元\n\n"
-        response += "回复「批准取款 <ID>」或「批准取款 <ID> <原因>」批准\n回复「拒绝取款 <ID> <原因>」拒绝"
+        parts.append(f"📒 存折余额：{self.manager.get_savings_balance()}元\n\n")
+        parts.append("回复「批准取款 <ID>」或「批准取款 <ID> <原因>」批准\n回复「拒绝取款 <ID> <原因>」拒绝")
         
-        yield event.plain_result(response)
+        yield event.plain_result("".join(parts))
 
     async def terminate(self):
-        """插件终止时保存数据"""
-        self.manager._save_data()
-        self.thank_manager._save_data()
-        self.backpack_manager._save_data()
-        self.isolation_manager._save_data()
+        """插件终止时保存数据（各管理器的文件并行写入）"""
+        managers = (self.__dict__.get(name) for name in ("manager", "thank_manager", "backpack_manager"))
+        # 从未使用过的管理器无需保存
+        await asyncio.gather(
+            *(mgr.flush_async() for mgr in managers if mgr is not None),
+            self.isolation_manager.flush_async()
+        )
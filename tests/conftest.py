@@ -0,0 +1,53 @@
+"""
+测试环境准备：把插件目录加入导入路径；未安装 AstrBot 时注册一个最小的 astrbot.api 替身，
+只提供 main.py 导入时用到的名字（装饰器原样返回被装饰函数）
+"""
+import logging
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import astrbot.api  # noqa: F401
+except ImportError:
+    def _passthrough(*args, **kwargs):
+        return lambda fn: fn
+
+    class _Filter:
+        command = staticmethod(_passthrough)
+        on_llm_request = staticmethod(_passthrough)
+        on_llm_response = staticmethod(_passthrough)
+
+    class _Star:
+        def __init__(self, context=None):
+            self.context = context
+
+    api = types.ModuleType("astrbot.api")
+    api.logger = logging.getLogger("astrbot")
+    api.AstrBotConfig = dict
+
+    event = types.ModuleType("astrbot.api.event")
+    event.filter = _Filter()
+    event.AstrMessageEvent = object
+
+    star = types.ModuleType("astrbot.api.star")
+    star.Context = object
+    star.Star = _Star
+    star.register = _passthrough
+
+    provider = types.ModuleType("astrbot.api.provider")
+    provider.LLMResponse = object
+    provider.ProviderRequest = object
+
+    astrbot = types.ModuleType("astrbot")
+    astrbot.api = api
+    api.event, api.star, api.provider = event, star, provider
+    sys.modules.update({
+        "astrbot": astrbot,
+        "astrbot.api": api,
+        "astrbot.api.event": event,
+        "astrbot.api.star": star,
+        "astrbot.api.provider": provider,
+    })
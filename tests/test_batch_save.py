@@ -0,0 +1,86 @@
+import asyncio
+import json
+import os
+
+import main
+from main import BatchSaveMixin
+
+
+class _Store(BatchSaveMixin):
+    _save_delay = 0.01
+
+    def __init__(self, path):
+        self.path = path
+
+    def _load_data(self):
+        return {"n": 0}
+
+    def _dump_data(self):
+        return self.path, main._json_dumps(self.data)
+
+    def bump(self):
+        self.data["n"] += 1
+        self._mark_dirty()
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_saves_immediately_without_event_loop(tmp_path):
+    store = _Store(str(tmp_path / "d.json"))
+    store.bump()
+    assert _read(store.path) == {"n": 1}
+
+
+def test_deferred_save_coalesces_changes(tmp_path, monkeypatch):
+    path = str(tmp_path / "d.json")
+    writes = []
+    real_write = main._write_bytes
+    monkeypatch.setattr(main, "_write_bytes", lambda p, b: (writes.append(b), real_write(p, b)))
+
+    async def run():
+        store = _Store(path)
+        with store.batch():
+            store.bump()
+            store.bump()
+        store.bump()
+        assert not os.path.exists(path)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    assert _read(path) == {"n": 3}
+    assert len(writes) == 1
+
+
+def test_older_snapshot_does_not_overwrite_newer(tmp_path):
+    store = _Store(str(tmp_path / "d.json"))
+    store._write_dump(5, store.path, b'{"n":5}')
+    store._write_dump(4, store.path, b'{"n":4}')
+    assert _read(store.path) == {"n": 5}
+
+
+def test_failed_deferred_write_is_retried(tmp_path, monkeypatch):
+    path = str(tmp_path / "d.json")
+    real_write = main._write_bytes
+    failures = []
+
+    def flaky_write(p, payload):
+        if not failures:
+            failures.append(p)
+            raise OSError("disk full")
+        real_write(p, payload)
+
+    monkeypatch.setattr(main, "_write_bytes", flaky_write)
+
+    async def run():
+        store = _Store(path)
+        store.bump()
+        await asyncio.sleep(0.2)
+        return store
+
+    store = asyncio.run(run())
+    assert failures == [path]
+    assert store._save_failures == 0
+    assert _read(path) == {"n": 1}
@@ -0,0 +1,21 @@
+from main import _bake_template, _safe_int
+
+
+def test_safe_int():
+    assert _safe_int(" 42 ") == 42
+    assert _safe_int("+7") == 7
+    assert _safe_int("-3") == -3
+    assert _safe_int("--3") is None
+    assert _safe_int("1.5", 0) == 0
+    assert _safe_int("", 5) == 5
+
+
+def test_bake_template_fills_static_fields_only():
+    baked = _bake_template("{name}有{balance:.2f}元 {note!r} {{字面}}", {"name": "贝塔", "balance": 1, "note": "x"})
+    assert baked == "贝塔有{balance:.2f}元 {note!r} {{字面}}"
+    assert baked.format(balance=3, note="n") == "贝塔有3.00元 'n' {字面}"
+
+
+def test_bake_template_escapes_braces_in_values():
+    baked = _bake_template("{a}-{b}", {"a": "{x}"})
+    assert baked.format(b=1) == "{x}-1"
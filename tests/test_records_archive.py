@@ -0,0 +1,77 @@
+import asyncio
+import json
+import os
+
+from main import PocketMoneyManager
+
+
+def _read_reasons(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["reason"] for line in f if line.strip()]
+
+
+def test_remove_records_archives_lines_outside_window(tmp_path):
+    mgr = PocketMoneyManager(str(tmp_path), 0, max_records=5)
+    for i in range(30):
+        mgr.add_income(1, f"r{i}", "admin")
+
+    removed = mgr.remove_records(lambda r: r["reason"] == "r27")
+
+    assert removed == 1
+    assert _read_reasons(mgr.records_path) == ["r25", "r26", "r28", "r29"]
+    assert _read_reasons(mgr.records_archive_path) == [f"r{i}" for i in range(25)]
+
+
+def test_remove_records_after_reload_keeps_full_history(tmp_path):
+    mgr = PocketMoneyManager(str(tmp_path), 0, max_records=5)
+    for i in range(10):
+        mgr.add_income(1, f"r{i}", "admin")
+
+    reloaded = PocketMoneyManager(str(tmp_path), 0, max_records=5)
+    reloaded.remove_records(lambda r: r["reason"] == "r9")
+
+    assert _read_reasons(reloaded.records_path) == ["r5", "r6", "r7", "r8"]
+    assert _read_reasons(reloaded.records_archive_path) == [f"r{i}" for i in range(5)]
+
+
+def test_compaction_skips_corrupt_lines(tmp_path):
+    mgr = PocketMoneyManager(str(tmp_path), 0, max_records=5)
+    for i in range(8):
+        mgr.add_income(1, f"r{i}", "admin")
+    with open(mgr.records_path, "ab") as f:
+        f.write(b'{"type": "income", "amo\n\n')
+
+    reloaded = PocketMoneyManager(str(tmp_path), 0, max_records=5)
+    reloaded.remove_records(lambda r: r["reason"] == "r7")
+
+    assert _read_reasons(reloaded.records_path) == ["r3", "r4", "r5", "r6"]
+    assert _read_reasons(reloaded.records_archive_path) == ["r0", "r1", "r2"]
+
+
+def test_remove_records_purges_archived_matches(tmp_path):
+    mgr = PocketMoneyManager(str(tmp_path), 0, max_records=3)
+    mgr.add_income(10, "seed", "admin")
+    mgr.add_expense(1, "hidden", isolation=True)
+    for i in range(5):
+        mgr.add_income(1, f"r{i}", "admin")
+    mgr.remove_records(lambda r: r["reason"] == "r4")
+    assert "hidden" in _read_reasons(mgr.records_archive_path)
+
+    mgr.add_expense(1, "hidden-too", isolation=True)
+    mgr.remove_records(lambda r: r.get("isolation"))
+
+    assert _read_reasons(mgr.records_archive_path) == ["seed", "r0", "r1"]
+    assert _read_reasons(mgr.records_path) == ["r2", "r3"]
+
+
+def test_record_and_balance_are_written_together(tmp_path):
+    async def run():
+        mgr = PocketMoneyManager(str(tmp_path), 10, max_records=5)
+        with mgr.batch():
+            mgr.add_expense(3, "奶茶")
+        with open(os.path.join(str(tmp_path), "pocket_money.json"), encoding="utf-8") as f:
+            return json.load(f)["balance"], _read_reasons(mgr.records_path)
+
+    assert asyncio.run(run()) == (7, ["奶茶"])
@@ -0,0 +1,51 @@
+from main import _parse_tag_amount, _parse_tag_fields, _scan_tags
+
+
+def test_parse_fields_normalizes_keys_and_punctuation():
+    fields = _parse_tag_fields("花费：5， 原因：请喝奶茶")
+    assert fields["spend"] == "5"
+    assert fields["reason"] == "请喝奶茶"
+
+
+def test_parse_fields_keys_are_case_insensitive():
+    assert _parse_tag_fields("spend: 5, REASON: x") == {"spend": "5", "reason": "x", "_rest": "REASON: x"}
+
+
+def test_parse_fields_tail_field_keeps_commas():
+    fields = _parse_tag_fields("Store: 雨伞, Desc: 蓝色的, 可以折叠")
+    assert fields["store"] == "雨伞"
+    assert fields["desc"] == "蓝色的, 可以折叠"
+
+
+def test_parse_fields_rest_without_reason_key():
+    fields = _parse_tag_fields("Spend: 5, 奶茶")
+    assert "reason" not in fields
+    assert fields["_rest"] == "奶茶"
+
+
+def test_parse_fields_empty_reason_is_kept_empty():
+    fields = _parse_tag_fields("Spend: 5, Reason: ")
+    assert fields["reason"] == ""
+
+
+def test_parse_amount():
+    assert _parse_tag_amount("4元") == 4.0
+    assert _parse_tag_amount("12.5") == 12.5
+    assert _parse_tag_amount("１０") == 10.0
+    assert _parse_tag_amount("很多") is None
+    assert _parse_tag_amount(None) is None
+
+
+def test_scan_tags_strips_known_tags_only():
+    text, tags = _scan_tags("买了奶茶 [Spend: 5, Reason: 奶茶] 真好喝 [普通括号]")
+    assert text == "买了奶茶真好喝 [普通括号]"
+    assert tags == {"spend": ["Spend: 5, Reason: 奶茶"]}
+
+
+def test_scan_tags_groups_by_kind_in_order():
+    _, tags = _scan_tags("[Note: a][Spend: 1][花费: 2][UseGift: 花]")
+    assert tags == {"note": ["Note: a"], "spend": ["Spend: 1", "花费: 2"], "use_gift": ["UseGift: 花"]}
+
+
+def test_scan_tags_without_tags_returns_text_unchanged():
+    assert _scan_tags("  没有标记  ") == ("  没有标记  ", {})